@@ -1,5 +1,6 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from time import sleep
 
 from dotenv import load_dotenv
 from pocketflow import Node
@@ -8,6 +9,7 @@ from agent.tools.parser import analyze_site
 from agent.tools.search import search_web
 from agent.tools.crawler import NewsCrawler
 from agent.utils import call_llm
+from agent.utils.structured import parse_structured
 import yaml
 
 load_dotenv()
@@ -16,6 +18,43 @@ __all__ = ["DecideAction", "SearchWeb", ]
 total_links_count = 0
 
 
+# 深度搜索时同时抓取并分析的链接数，所有热词共用
+_link_executor = ThreadPoolExecutor(max_workers=max(int(os.getenv("DEEPSEARCH_LINK_WORKERS", "3")), 1),
+                                    thread_name_prefix="deepsearch")
+
+
+def _crawl_and_analyze(link, language, logger):
+    crawler = NewsCrawler(link)
+    crawl_content = crawler.extract_information()
+    if crawl_content['text'] != '':
+        return analyze_site(crawl_content, logger, language)
+    logger.info(f"🌐 深度搜索信息为空或者是二进制视频: {link}")
+    return {}
+
+
+def _crawl_and_analyze_all(results_dict, language, logger):
+    """
+    在线程池中并发抓取并分析搜索结果中的链接，从提交起超过 DEEPSEARCH_LINK_TIMEOUT 秒仍未完成的链接即放弃，不再等待；
+    尚未开始执行的链接同时取消，避免卡住的线程占满线程池后排队的链接永远不结束
+    :return: 与 results_dict 顺序一致的 [(分析结果, 异常), ...]
+    """
+    timeout = float(os.getenv("DEEPSEARCH_LINK_TIMEOUT", "90"))
+    outcomes = [({}, None)] * len(results_dict)
+    pending = {_link_executor.submit(_crawl_and_analyze, item['link'], language, logger): index
+               for index, item in enumerate(results_dict)}
+    done, not_done = wait(pending, timeout=timeout)
+    for future in done:
+        try:
+            outcomes[pending[future]] = (future.result(), None)
+        except Exception as e:
+            outcomes[pending[future]] = ({}, e)
+    for future in not_done:
+        # 线程无法被强制终止，正在执行的链接只是不再等待它的结果
+        future.cancel()
+        outcomes[pending[future]] = ({}, TimeoutError(f"超过 {timeout:.0f} 秒未完成，已跳过"))
+    return outcomes
+
+
 class DecideAction(Node):
     def prep(self, shared):
         """准备上下文和问题，用于决策过程。
@@ -35,7 +74,8 @@ class DecideAction(Node):
         search_volume = shared["search_volume"]
         search_growth_rate = shared["search_growth_rate"]
         search_active_time = shared["search_active_time"]
-        current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 只精确到日期，同一天内重新研究时提示词不变，可以命中 LLM 响应缓存
+        current_date = datetime.now().strftime("%Y-%m-%d")
         shared["current_date"] = current_date
         logger = shared["logger"]
         language = shared["language"]
@@ -66,7 +106,7 @@ class DecideAction(Node):
 查询优先级：事件基本信息>事件发展脉络>社会影响范围>争议焦点>官方回应>关联事件
 
 ## 上下文
-- 当前时间: {current_date}
+- 当前日期: {current_date}
 - 时下流行热词: {hot_word}
 {desc}
 - 相关新闻报导标题：
@@ -114,22 +154,17 @@ search_query: |
 4. 不允许直接在键后嵌套另一个键（如 answer: search_query:)
 5. 非键值对不允许随意使用冒号: 
 """
-        # 调用 LLM 进行决策
-        response, success = call_llm(prompt, logger)
+        # 调用 LLM 进行决策（提示词包含当前时间，且每一步都需要重新决策，不使用响应缓存）
+        response, success = call_llm(prompt, logger, cache=False, stop_after_yaml=True, schema="decide_action")
         if not success:
             logger.error("LLM 响应失败，请检查你的响应格式。")
             return {"action": "finish", "reason": "LLM 响应失败"}
 
-        # 解析响应以获取决策
-        if "```yaml" not in response:
-            logger.error("LLM 响应格式不正确，请检查你的响应格式。")
-            return {"action": "finish", "reason": "LLM 响应格式不正确"}
-        try:
-            yaml_str = response.replace("\"", "").replace("\'", "").split("```yaml")[1].split("```")[0].strip()
-            logger.info(f"LLM 响应: {yaml_str}")
-            decision = yaml.safe_load(yaml_str)
-        except Exception as e:
+        # 解析响应以获取决策（结构化输出为 JSON，失败时按 YAML 修复解析）
+        decision = parse_structured(response, "decide_action", logger)
+        if decision is None:
             return {"action": "finish", "reason": "LLM 响应格式不正确"}
+        logger.info(f"LLM 响应: {decision}")
 
         return decision
 
@@ -161,45 +196,27 @@ class SearchWeb(Node):
         global total_links_count  # 声明使用全局变量
         search_query, hot_word_path, language, logger = inputs
         logger.info(f"🌐 在网络上搜索: {search_query}")
-        sleep(5)
         _, results_dict = search_web(search_query, hot_word_path, logger)
         analyzed_results = []
         if results_dict is None:
             logger.info(f"🌐 深度搜索失败。")
             return {"action": "finish", "reason": "搜索失败"}
         for i in results_dict:
-            title = i['title']
-            snippet = i['snippet']
-            link = i['link']
-
             logger.info(f"🌐 对搜索的内容进项深度扫描")
-            logger.info(f"🌐 标题:{title}")
-            logger.info(f"🌐 摘要:{snippet}")
-
-            logger.info(f"🌐 源链接:{link}")
-
-            try:
-                crawler = NewsCrawler(link)
-                crawl_content = crawler.extract_information()
-                if crawl_content['text'] != '':
-                    crawl_content_analyze = analyze_site(crawl_content, logger, language)
-                else:
-                    logger.info(f"🌐 深度搜索信息为空或者是二进制视频")
-                    crawl_content_analyze = {}
-            except Exception as e:
-                analyzed_results.append({
-                    "results": {},
-                    "title": title,
-                    "url": link,
-                    'snippet': snippet
-                })
-                logger.error(f"深度搜索失败: {e}")
-                continue
+            logger.info(f"🌐 标题:{i['title']}")
+            logger.info(f"🌐 摘要:{i['snippet']}")
+            logger.info(f"🌐 源链接:{i['link']}")
+
+        # 并发抓取并分析所有链接，结果保持搜索结果的原始顺序
+        for item, (crawl_content_analyze, error) in zip(results_dict,
+                                                         _crawl_and_analyze_all(results_dict, language, logger)):
+            if error is not None:
+                logger.error(f"深度搜索失败 {item['link']}: {error}")
             analyzed_results.append({
                 "results": crawl_content_analyze,
-                "title": title,
-                "url": link,
-                'snippet': snippet
+                "title": item['title'],
+                "url": item['link'],
+                'snippet': item['snippet']
             })
 
         results = []
@@ -1,14 +1,13 @@
 import csv
 import os
 from datetime import datetime
-from time import sleep
 
 from dotenv import load_dotenv
 from pocketflow import Node
 
 from agent.tools.summary2md import generate_news_summary_report
-from agent.utils import get_images, call_llm
-import yaml
+from agent.utils import get_images, call_llm, get_llm_client
+from agent.utils.structured import parse_structured
 
 load_dotenv()
 
@@ -34,7 +33,8 @@ class ContentSummarizer(Node):
     def exec(self, inputs):
         """调用 LLM 编制草稿。"""
         current_date, hot_word, search_volume, search_growth_rate, search_active_time, search_history, context, language, logger = inputs
-        current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 只精确到日期，同一天内重新生成时提示词不变，可以命中 LLM 响应缓存
+        current_date = datetime.now().strftime("%Y-%m-%d")
         hot_word_info = f"此热词从{search_active_time}开始搜索活跃,搜索量上升{search_growth_rate},搜索总量达到{search_volume}"
         hot_word = hot_word.split("-",1)[1]
         logger.info(f"编制草稿...")
@@ -54,7 +54,7 @@ class ContentSummarizer(Node):
 
 ### 输入格式:
 
-当前时间: {current_date}
+当前日期: {current_date}
 时下流行热词: {hot_word}
 
 {hot_word_info}
@@ -106,19 +106,15 @@ output: |
 - 不要对 `chinese` 和 `output` 字段进行嵌套或添加额外结构
 """
         # 调用 LLM 生成草稿
-        search_data, success = call_llm(prompt, logger)
-        if "```yaml" not in search_data:
-            logger.error("LLM 响应格式不正确，请检查你的响应格式。")
-            return {"action": "finish", "reason": "LLM 响应格式不正确"}
-        try:
-            yaml_str = search_data.split("```yaml")[1].split("```")[0].strip()
-        except Exception as e:
-            return {"action": "finish", "reason": "LLM 响应格式不正确"}
-        logger.info(f"LLM 响应: \n {yaml_str}")
-        response = yaml.safe_load(yaml_str)
+        search_data, success = call_llm(prompt, logger, stop_after_yaml=True, schema="content_summary")
         if not success:
             logger.error("LLM 响应失败，请检查你的响应格式。")
             return {"action": "finish", "reason": "LLM 响应失败"}
+        # 解析结构化输出（JSON），失败时按 YAML 修复解析
+        response = parse_structured(search_data, "content_summary", logger)
+        if response is None:
+            return {"action": "finish", "reason": "LLM 响应格式不正确"}
+        logger.info(f"LLM 响应: \n {response}")
 
         return search_data, response
 
@@ -329,38 +325,29 @@ class ImageMatchScorer(Node):
         images_list = get_images(hot_word_path)
         if len(images_list) > 8:  # //只评估8张图片
             images_list = images_list[:8]
-        for image_path in images_list:
-            sleep(5)
-            response, success = call_llm(prompt, logger, image_path)
+        # 所有图片一次性提交给 LLM 客户端并发评分，并发数与调用频率由客户端统一控制，结果按图片顺序返回
+        responses = get_llm_client().map([(prompt, image_path) for image_path in images_list], logger=logger,
+                                         stop_after_yaml=True, schema="image_score")
+        for image_path, (response, success) in zip(images_list, responses):
             if not success:
                 logger.error("LLM 调用失败，请检查你的配置。")
                 return {"action": "finish", "reason": "LLM 调用失败"}
             logger.info(f"LLM 响应: {response}")
-            if "```yaml" not in response:
-                logger.error("LLM 响应格式不正确，请检查你的响应格式。")
-                return {"action": "finish", "reason": "LLM 响应格式不正确"}
-            try:
-                yaml_str = response.split("```yaml")[1].split("```")[0].strip()
-                decision = yaml.safe_load(yaml_str)
-            except Exception as e:
-                logger.error(f"处理 LLM 响应时发生错误: {e}")
+            # 解析结构化输出（JSON），失败时按 YAML 修复解析，评分字段统一转换为整数
+            decision = parse_structured(response, "image_score", logger)
+            if decision is None:
                 continue
 
-            if isinstance(decision, dict) and "total_score" in decision:
-                # 提取总分并重命名图片
-                try:
-                    total_score = int(decision["total_score"])
-                except ValueError:
-                    logger.error(f"无法将 total_score 转换为整数: {decision['total_score']}")
-                    continue
-                image_name = os.path.basename(image_path)
-                new_image_name = f"{total_score}_{image_name}"
-                new_image_path = os.path.join(hot_word_path, new_image_name)
-                try:
-                    os.rename(image_path, new_image_path)
-                    logger.info(f"图片已重命名为: {new_image_name}")
-                except Exception as e:
-                    logger.error(f"重命名图片时发生错误: {e}")
+            # 提取总分并重命名图片
+            total_score = decision["total_score"]
+            image_name = os.path.basename(image_path)
+            new_image_name = f"{total_score}_{image_name}"
+            new_image_path = os.path.join(hot_word_path, new_image_name)
+            try:
+                os.rename(image_path, new_image_path)
+                logger.info(f"图片已重命名为: {new_image_name}")
+            except Exception as e:
+                logger.error(f"重命名图片时发生错误: {e}")
             result_list.append(decision)
 
         return result_list
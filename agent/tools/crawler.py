@@ -1,69 +1,250 @@
+import codecs
 import os
 import random
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import newspaper
+import requests
 from newspaper.configuration import Configuration
+from requests.adapters import HTTPAdapter
 
 from dotenv import load_dotenv
 
+from agent.utils.cache import SqliteTTLCache
+from core.rate_limiter import get_host_rate_limiter
+from webui.utils.constant import root_dir
+
 load_dotenv()
 
-__all__ = ["NewsCrawler"]
+__all__ = ["NewsCrawler", "canonical_url", "TEXT_BUDGET"]
+
+# 规范化链接时去掉的跟踪参数
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ocid", "cmpid", "spm")
+# 多设备User-Agent池
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.4 (KHTML, like Gecko) Version/14.0 Mobile/15A5370a Safari/604.1",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/535.11 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.4 (KHTML, like Gecko) Version/14.0 Mobile/15A5370a Safari/604.1"
+]
+# 下载网页时的请求头，User-Agent 按实例随机选择
+_BASE_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Referer": "https://www.google.com/",
+    "Cache-Control": "no-cache",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Sec-Fetch-User": "?1"
+}
+
+
+def canonical_url(url):
+    """规范化链接作为缓存键：小写协议和域名，去掉默认端口、锚点和跟踪参数，查询参数按名称排序"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith(_TRACKING_PARAMS))
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(query), ""))
+
+
+# 正文只保留前 TEXT_BUDGET 个字符，下载时读到足够的段落文本即停止
+TEXT_BUDGET = 2000
+_HTML_TYPES = ("text/html", "application/xhtml+xml")
+_PARAGRAPH = re.compile(r"<p\b[^>]*>(.*?)</p>", re.S | re.I)
+_TAG = re.compile(r"<[^>]+>")
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.I)
+
+
+def _encoding(content_type, head):
+    """Content-Type 或 <meta charset> 中声明的编码，都没有或无法识别时为 UTF-8"""
+    match = re.search(r"charset=([\w-]+)", content_type) or _META_CHARSET.search(head)
+    encoding = match.group(1) if match else "utf-8"
+    if isinstance(encoding, bytes):
+        encoding = encoding.decode("ascii")
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return "utf-8"
+    return encoding
+
+
+def _read_html(response):
+    """
+    在读取正文之前先检查响应头：不是 HTML 或 Content-Length 超过 NEWS_MAX_MB 时直接放弃；
+    读取过程中超过 NEWS_MAX_MB 即截断，段落文本达到 TEXT_BUDGET 的 NEWS_TEXT_MARGIN 倍时提前停止读取
+    :return: (HTML 文本, 是否提前停止或截断)，不需要解析时返回 (None, False)
+    """
+    content_type = response.headers.get("Content-Type", "").lower()
+    if content_type and not content_type.startswith(_HTML_TYPES):
+        return None, False
+    max_bytes = int(float(os.getenv("NEWS_MAX_MB", "2")) * 1024 * 1024)
+    content_length = response.headers.get("Content-Length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        return None, False
+    enough_chars = TEXT_BUDGET * float(os.getenv("NEWS_TEXT_MARGIN", "3"))
+    size, decoder, truncated = 0, None, False
+    # 增量解码：每个分片只解码一次，段落只在尚未扫描过的文本中查找
+    parts, pending, paragraph_chars = [], "", 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        if size + len(chunk) >= max_bytes:
+            chunk, truncated = chunk[:max_bytes - size], True
+        size += len(chunk)
+        if decoder is None:
+            # 编码按第一个分片（包含 <head>）确定
+            decoder = codecs.getincrementaldecoder(_encoding(content_type, chunk[:4096]))(errors="replace")
+        text = decoder.decode(chunk)
+        parts.append(text)
+        # pending 保留上一个分片中未闭合的段落
+        pending += text
+        last_end = 0
+        for match in _PARAGRAPH.finditer(pending):
+            paragraph_chars += len(_TAG.sub("", match.group(1)).strip())
+            last_end = match.end()
+        # 只保留最后一个可能未闭合的 <p 之后的文本，没有时保留末尾两个字符（“<p” 可能被分片截断）
+        rest = pending[last_end:]
+        open_at = rest.lower().rfind("<p")
+        pending = rest[open_at:] if open_at != -1 else rest[-2:]
+        if truncated or paragraph_chars >= enough_chars:
+            truncated = True
+            break
+    if decoder is None:
+        return "", False
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts), truncated
 
 
+_session = None
+_config = None
+_cache = None
+_lock = threading.Lock()
+
+
+def _get_session():
+    """所有 NewsCrawler 共用的会话，按域名保持长连接"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            size = int(os.getenv("NEWS_POOL_SIZE", "10"))
+            adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            proxy_url = os.getenv("PROXY_URL")
+            if proxy_url:
+                session.proxies = {"http": proxy_url, "https": proxy_url}
+            _session = session
+        return _session
+
+
+def _get_config():
+    """所有 NewsCrawler 共用的 newspaper 解析配置（网页由 fetch_html 下载，newspaper 只负责解析）"""
+    global _config
+    with _lock:
+        if _config is None:
+            config = Configuration()
+            config.memoize_articles = False  # 禁用缓存，确保获取最新内容
+            config.verbose = False  # 关闭详细日志
+            proxy_url = os.getenv("PROXY_URL")
+            config.requests_params = {
+                "timeout": 30,
+                "proxies": {"http": proxy_url, "https": proxy_url} if proxy_url else None,
+            }
+            _config = config
+        return _config
+
+
+def _get_cache():
+    """新闻网页缓存，NEWS_CACHE=false 时返回 None"""
+    global _cache
+    if os.getenv("NEWS_CACHE", "true").lower() != "true":
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = SqliteTTLCache(os.path.join(root_dir, os.getenv("NEWS_CACHE_PATH", "news_cache.db")),
+                                    ttl=float(os.getenv("NEWS_CACHE_TTL_HOURS", "72")) * 3600,
+                                    max_bytes=int(float(os.getenv("NEWS_CACHE_MAX_MB", "200")) * 1024 * 1024))
+        return _cache
+
 
 class NewsCrawler:
+    """
+    抓取并解析新闻网页
+    网页通过共享会话流式下载，非 HTML 内容在读取正文前即被跳过，正文读够即停止；
+    按规范化链接缓存在 SQLite 中：NEWS_CACHE_FRESH_MINUTES 内直接使用缓存，
+    之后携带 ETag / Last-Modified 发起条件请求，服务器返回 304 时复用缓存内容
+    """
 
     def __init__(self, source_urls_=None):
 
         # 使用 None 避免可变默认参数问题
         self.source_urls_ = source_urls_
-        config = Configuration()
-        config.memoize_articles = False  # 禁用缓存，确保获取最新内容
-        config.verbose = False  # 关闭详细日志
-        proxy_url = os.getenv("PROXY_URL")
-        proxies = {
-            "http": proxy_url,
-            "https": proxy_url
-        } if proxy_url else None
-        # 多设备User-Agent池
-        user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.4 (KHTML, like Gecko) Version/14.0 Mobile/15A5370a Safari/604.1",
-            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/535.11 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.4 (KHTML, like Gecko) Version/14.0 Mobile/15A5370a Safari/604.1"
-        ]
-
-        # 随机选择User-Agent
-        selected_ua = random.choice(user_agents)
-        config.requests_params = {
-            "timeout": 30,
-            "proxies": proxies,
-            "headers": {
-                "User-Agent": selected_ua,
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8",
-                "Accept-Encoding": "gzip, deflate, br",
-                "Referer": "https://www.google.com/",
-                "Connection": "keep-alive",
-                "Cache-Control": "no-cache",
-                "Upgrade-Insecure-Requests": "1",
-                "Sec-Fetch-Dest": "document",
-                "Sec-Fetch-Mode": "navigate",
-                "Sec-Fetch-Site": "none",
-                "Sec-Fetch-User": "?1"
-            },
-        }
-        self.config = config
+        # 随机选择User-Agent，其余请求头所有实例相同
+        self.headers = {**_BASE_HEADERS, "User-Agent": random.choice(USER_AGENTS)}
+        # 所有实例共用一份解析配置，请求头只在本实例下载网页时使用
+        self.config = _get_config()
+
+    def fetch_html(self):
+        """
+        下载网页 HTML，优先使用缓存或条件请求
+        :return: HTML 文本，不是网页（视频、PDF 等）或网页过大时返回 None
+        """
+        url = self.source_urls_
+        cache = _get_cache()
+        key = canonical_url(url)
+        hit, cached = cache.get(key) if cache is not None else (False, None)
+        fresh_seconds = float(os.getenv("NEWS_CACHE_FRESH_MINUTES", "60")) * 60
+        if hit and time.time() - cached["fetched_at"] < fresh_seconds:
+            return cached["html"]
+
+        headers = dict(self.headers)
+        if hit:
+            # 缓存已过新鲜期，向服务器确认内容是否有变化
+            headers.pop("Cache-Control", None)
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        # 按站点限速（RATE_LIMIT_<域名>），未配置的站点不限速
+        get_host_rate_limiter(url).acquire()
+        with _get_session().get(url, headers=headers, stream=True,
+                                timeout=self.config.requests_params["timeout"]) as response:
+            if response.status_code == 304 and hit:
+                html = cached["html"]
+            elif response.status_code == 200:
+                html, truncated = _read_html(response)
+                if html is None:
+                    return None
+                # 提前停止读取的网页不完整，不保存 ETag / Last-Modified，之后不会用 304 复用这份不完整的内容
+                cached = {"etag": None if truncated else response.headers.get("ETag"),
+                          "last_modified": None if truncated else response.headers.get("Last-Modified")}
+            else:
+                raise RuntimeError(f"下载网页失败，状态码: {response.status_code}")
+        if cache is not None:
+            cache.set(key, {"url": url, "html": html, "etag": cached.get("etag"),
+                            "last_modified": cached.get("last_modified"), "fetched_at": time.time()})
+        return html
 
     def extract_information(self):
+        html = self.fetch_html()
+        if html is None:
+            return {"title": "", "authors": [], "text": "", "url": self.source_urls_}
         article = newspaper.Article(url=self.source_urls_,config=self.config)
-        article.download()
+        article.download(input_html=html)
         article.parse()
         return {
             "title": article.title,
             "authors": article.authors,
-            "text": article.text[:2000],
+            "text": article.text[:TEXT_BUDGET],
             "url": article.url
         }
 
@@ -0,0 +1,218 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import imagehash
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+
+from webui.utils.constant import root_dir
+
+load_dotenv()
+
+__all__ = ["IMAGE_EXTENSIONS", "image_hash", "HotWordHashes", "ImageHashIndex", "get_image_hash_index",
+           "hash_threshold", "link_or_copy"]
+
+# 参与去重的图片扩展名
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# 每个热词文件夹下的哈希缓存文件
+SIDECAR_NAME = ".image_hashes.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    hash INTEGER NOT NULL,
+    hot_word_dir TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+"""
+
+# 0-255 每个字节中 1 的个数，用于向量化计算汉明距离
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hash_threshold():
+    """汉明距离小于该值的两张图片视为相似（average_hash 共 64 位）"""
+    return int(os.getenv("IMAGE_HASH_THRESHOLD", "10"))
+
+
+def image_hash(img):
+    """计算图片的 average_hash，返回 64 位无符号整数"""
+    return int(str(imagehash.average_hash(img)), 16)
+
+
+def hamming_distances(hashes, value):
+    """计算 uint64 数组中每个哈希与 value 的汉明距离"""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _to_signed(value):
+    # SQLite 的 INTEGER 为有符号 64 位
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def link_or_copy(src, dst):
+    """优先创建硬链接，同一张图片在磁盘上只存一份；跨磁盘等无法链接时退回为复制"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class HotWordHashes:
+    """
+    单个热词文件夹的图片哈希缓存，持久化在文件夹下的 .image_hashes.json 中（文件名 -> 十六进制哈希）
+    加载时只为缓存中没有的新图片计算哈希，并剔除已删除的图片，已经算过的图片不会被重新解码
+    """
+
+    def __init__(self, hot_word_path, logger=None, index=None):
+        self.hot_word_path = hot_word_path
+        self.logger = logger
+        self.index = index
+        self.sidecar_path = os.path.join(hot_word_path, SIDECAR_NAME)
+        self._lock = threading.Lock()
+        self.hashes = self._load()
+
+    def _load(self):
+        try:
+            with open(self.sidecar_path, "r", encoding="utf-8") as f:
+                cached = {name: int(value, 16) for name, value in json.load(f).items()}
+        except (OSError, ValueError):
+            cached = {}
+        names = [f for f in os.listdir(self.hot_word_path) if f.lower().endswith(IMAGE_EXTENSIONS)]
+        hashes = {name: cached[name] for name in names if name in cached}
+        for name in names:
+            if name in hashes:
+                continue
+            img_path = os.path.join(self.hot_word_path, name)
+            try:
+                with Image.open(img_path) as img:
+                    hashes[name] = image_hash(img)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"计算图片 {img_path} 哈希值时发生异常: {e}")
+                continue
+            if self.index is not None:
+                self.index.add(hashes[name], img_path, self.hot_word_path)
+        if hashes != cached:
+            self._save(hashes)
+        return hashes
+
+    def _save(self, hashes):
+        tmp_path = self.sidecar_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({name: f"{value:016x}" for name, value in hashes.items()}, f)
+        os.replace(tmp_path, self.sidecar_path)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def find(self, value, threshold=None):
+        """返回文件夹中与 value 相似的图片文件名，没有时返回 None"""
+        threshold = hash_threshold() if threshold is None else threshold
+        with self._lock:
+            names = list(self.hashes)
+            if not names:
+                return None
+            distances = hamming_distances(np.array([self.hashes[n] for n in names], dtype=np.uint64), value)
+        best = int(distances.argmin())
+        return names[best] if distances[best] < threshold else None
+
+    def add(self, name, value):
+        with self._lock:
+            self.hashes[name] = value
+            self._save(self.hashes)
+        if self.index is not None:
+            self.index.add(value, os.path.join(self.hot_word_path, name), self.hot_word_path)
+
+
+class ImageHashIndex:
+    """
+    跨任务、跨地区的全局图片哈希索引（SQLite 持久化），查询时在内存中的 uint64 数组上向量化计算汉明距离，
+    用于发现其他热词文件夹中已经保存过的同一张图片（如通稿配图），复用已有文件而不是重复下载保存
+    """
+
+    def __init__(self, path=None, logging=None):
+        self.path = path or os.path.join(root_dir, os.getenv("IMAGE_HASH_INDEX_PATH", "image_hashes.db"))
+        self.logging = logging
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+        rows = self._conn.execute("SELECT path, hash FROM images").fetchall()
+        self._paths = [row[0] for row in rows]
+        self._hashes = np.zeros(max(len(rows), 1024), dtype=np.uint64)
+        self._hashes[:len(rows)] = [_to_unsigned(row[1]) for row in rows]
+        self._size = len(rows)
+        # 路径 -> 在 _hashes / _paths 中的位置，同一路径重新加入时覆盖原位置
+        self._slots = {path: slot for slot, path in enumerate(self._paths)}
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value, path, hot_word_dir):
+        path = os.path.abspath(path)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO images (path, hash, hot_word_dir, added_at) "
+                                   "VALUES (?, ?, ?, ?)",
+                                   (path, _to_signed(value), os.path.abspath(hot_word_dir), time.time()))
+            slot = self._slots.get(path)
+            if slot is not None:
+                self._hashes[slot] = value
+                return
+            if self._size == len(self._hashes):
+                self._hashes = np.concatenate([self._hashes, np.zeros(len(self._hashes), dtype=np.uint64)])
+            self._hashes[self._size] = value
+            self._paths.append(path)
+            self._slots[path] = self._size
+            self._size += 1
+
+    def find(self, value, threshold=None, exclude_dir=None):
+        """
+        查找与 value 相似且仍存在于磁盘上的图片
+        :param exclude_dir: 忽略该文件夹下的图片（热词自身的图片由 HotWordHashes 判断）
+        :return: 图片的绝对路径，没有时返回 None
+        """
+        threshold = hash_threshold() if threshold is None else threshold
+        exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+        with self._lock:
+            if not self._size:
+                return None
+            distances = hamming_distances(self._hashes[:self._size], value)
+            candidates = np.flatnonzero(distances < threshold)
+            paths = [self._paths[i] for i in candidates[np.argsort(distances[candidates])]]
+        for path in paths:
+            if exclude_dir and os.path.dirname(path) == exclude_dir:
+                continue
+            if os.path.exists(path):
+                return path
+        return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_image_hash_index(logging=None):
+    """获取全局唯一的图片哈希索引，IMAGE_HASH_INDEX=false 时返回 None"""
+    global _index
+    if os.getenv("IMAGE_HASH_INDEX", "true").lower() != "true":
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = ImageHashIndex(logging=logging)
+    return _index
@@ -1,6 +1,7 @@
 import re
 from typing import Dict, List
 from agent.utils.call_llm import call_llm
+from agent.utils.structured import parse_structured
 
 __all__ = ["analyze_content", "analyze_site"]
 
@@ -44,25 +45,14 @@ content_type: <填写内容类型>
 """
 
     try:
-        response, success = call_llm(prompt, logger=logger)
+        response, success = call_llm(prompt, logger=logger, stop_after_yaml=True, schema="site_analysis")
         if not success:
-            logger.error("LLM 响应失败，请检查你的响应格式。")
-            return {"action": "finish", "reason": "LLM 响应失败"}
-
-        # 提取代码块中的YAML内容
-        if "```yaml" not in response:
-            logger.error("LLM 响应格式不正确，请检查你的响应格式。")
-            return {"action": "finish", "reason": "LLM 响应格式不正确"}
-        yaml_str = response.split("```yaml")[1].split("```")[0].strip()
-        import yaml
-        analysis = yaml.safe_load(yaml_str)
-
-        # 验证必要字段是否存在
-        assert "summary" in analysis
-        assert "topics" in analysis
-        assert "content_type" in analysis
-        assert "title" in analysis
-        assert isinstance(analysis["topics"], list)
+            raise RuntimeError("LLM 响应失败")
+
+        # 解析结构化输出（JSON），失败时按 YAML 修复解析，并补全 title/summary/topics/content_type 字段
+        analysis = parse_structured(response, "site_analysis", logger)
+        if analysis is None:
+            raise ValueError("LLM 响应格式不正确")
 
         return analysis
 
@@ -1,19 +1,23 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from io import BytesIO
-from time import sleep
 
-from duckduckgo_search import DDGS
-import imagehash
 from PIL import Image
 import requests
+from requests.adapters import HTTPAdapter
 import os
 from serpapi import GoogleSearch
 from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
 
+from agent.tools.image_index import HotWordHashes, get_image_hash_index, image_hash, link_or_copy
+from agent.tools.search_client import get_search_client
+
 load_dotenv()
 
-__all__ = ["search_web"]
+__all__ = ["search_web", "search_web_many"]
 # 设置代理
 proxies = {
     "http": f"{os.getenv('PROXY_URL')}",
@@ -22,6 +26,11 @@ proxies = {
 
 search_web_call_count = 0
 
+# 图片下载共用的会话和线程池，首次下载图片时创建
+_image_session = None
+_image_executor = None
+_image_lock = threading.Lock()
+
 
 #
 # class SearchTool:
@@ -80,49 +89,26 @@ search_web_call_count = 0
 
 def search_web(query, hot_word_path, logger, num_results=3):
     try:
-        # 使用serper.dev进行网络搜索
+        # 配置了 SERPAPI_API_KEY 时使用serper.dev进行网络搜索，否则使用DuckDuckgo
         # logger.info(f"## 查询: {query}")
-
-        api_key = os.getenv("SERPAPI_API_KEY", None)
-        if api_key:
-            global search_web_call_count
-            search_web_call_count += 1
-            sleep(5)
+        global search_web_call_count
+        search_web_call_count += 1
+        client = get_search_client()
+        if client.backend == "serper":
             logger.info(f"[SearchWeb] 第 {search_web_call_count} 次调用，查询词: {query}")
-
-            url = "https://google.serper.dev/search"
-            headers = {
-                "X-API-KEY": api_key,
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "q": query,
-                "engine": "google",
-                "num": num_results
-            }
-            response = requests.post(url, headers=headers, json=payload, proxies=proxies)
-            if response.status_code == 200:
-                results = response.json().get("organic", [])
-                results_str = "\n\n".join(
-                    [f"标题: {r['title']}\n源链接: {r['link']}\n摘要: {r['snippet']}" for r in results])
-                results_dict = [{'title': r['title'], 'snippet': r['snippet'], 'link': r['link']} for r in results]
-                try:
-                    search_image(query, hot_word_path, search_web_call_count, logger)
-                except  Exception as e:
-                    logger.error(f"搜索图片时发生异常: {e}")
-            else:
-                logger.error(f"错误: 无法获取搜索结果。状态码: {response.status_code}")
-                return "错误: 无法获取搜索结果。", None
         else:
             logger.info(f"使用DuckDuckgo免费搜索进行查询")
-
-            with DDGS(proxy=os.getenv("PROXY_URL"), timeout=20) as ddgs:
-                news_results = ddgs.text(query, max_results=num_results)
-                search_image(query, hot_word_path, logger)
-                # Convert results to a string
-                results_str = "\n\n".join(
-                    [f"标题: {r['title']}\n源链接: {r['href']}\n摘要: {r['body']}" for r in news_results])
-                results_dict = [{'title': r['title'], 'snippet': r['body'], 'link': r['href']} for r in news_results]
+        try:
+            results_dict = client.search(query, num_results, logger=logger)
+        except Exception as e:
+            logger.error(f"错误: 无法获取搜索结果。{e}")
+            return "错误: 无法获取搜索结果。", None
+        results_str = "\n\n".join(
+            [f"标题: {r['title']}\n源链接: {r['link']}\n摘要: {r['snippet']}" for r in results_dict])
+        try:
+            search_image(query, hot_word_path, search_web_call_count, logger)
+        except Exception as e:
+            logger.error(f"搜索图片时发生异常: {e}")
         # logger.info(f"## 结果: {results_str}")
         return results_str, results_dict
     except Exception as e:
@@ -130,60 +116,136 @@ def search_web(query, hot_word_path, logger, num_results=3):
         return "错误: 搜索网络时发生异常。", None
 
 
+def search_web_many(queries, logger, num_results=3):
+    """
+    并发搜索多个查询词（不下载图片）
+    :return: 与 queries 顺序一致的 [(results_str, results_dict), ...]，失败的查询为 ("错误: ...", None)
+    """
+    results = []
+    for query, result in zip(queries, get_search_client().search_many(queries, num_results, logger=logger)):
+        if isinstance(result, Exception):
+            logger.error(f"查询 {query} 时发生异常: {result}")
+            results.append(("错误: 无法获取搜索结果。", None))
+            continue
+        results_str = "\n\n".join(
+            [f"标题: {r['title']}\n源链接: {r['link']}\n摘要: {r['snippet']}" for r in result])
+        results.append((results_str, result))
+    return results
+
+
+def _image_fetch_workers():
+    return max(int(os.getenv("IMAGE_FETCH_WORKERS", "4")), 1)
+
+
+def _get_image_session():
+    global _image_session, _image_executor
+    with _image_lock:
+        if _image_session is None:
+            workers = _image_fetch_workers()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _image_session = session
+            # 所有热词共用同一个下载线程池，并发下载数不超过 IMAGE_FETCH_WORKERS
+            _image_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image_fetch")
+        return _image_session, _image_executor
+
+
+def _fetch_image(session, image_url):
+    """
+    流式下载一张图片并计算哈希值：先检查状态码、Content-Type 和 Content-Length，
+    下载过程中超过 IMAGE_MAX_MB 或总耗时超过 IMAGE_FETCH_TIMEOUT 时立即放弃
+    :return: (图片内容, 哈希值)，不符合要求时抛出异常
+    """
+    timeout = float(os.getenv("IMAGE_FETCH_TIMEOUT", "15"))
+    max_bytes = int(float(os.getenv("IMAGE_MAX_MB", "10")) * 1024 * 1024)
+    deadline = time.monotonic() + timeout
+    with session.get(image_url, stream=True, timeout=(min(timeout, 5), timeout)) as response:
+        if response.status_code != 200:
+            raise ValueError(f"状态码: {response.status_code}")
+        content_type = response.headers.get("Content-Type", "").lower()
+        if content_type and not content_type.startswith("image/"):
+            raise ValueError(f"不是图片: {content_type}")
+        content_length = response.headers.get("Content-Length", "")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            raise ValueError(f"图片过大: {int(content_length)} 字节")
+        chunks, size = [], 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f"图片超过 {max_bytes} 字节")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"下载超过 {timeout} 秒")
+            chunks.append(chunk)
+    content = b"".join(chunks)
+    with Image.open(BytesIO(content)) as img:
+        return content, image_hash(img)
+
+
 def search_image(query, hot_word_path, search_web_call_count, logger, num_results=8):
     # logger.info(f"## 查询: {query}")
 
-    # 检查 hot_word_path 目录下的图片数量
-    existing_images = [f for f in os.listdir(hot_word_path) if f.endswith(('.jpg', '.png'))]
-    if len(existing_images) >= num_results:
-        logger.info(f"目录 {hot_word_path} 中已有 {len(existing_images)} 张图片，不再下载新图片。")
+    # 读取热词文件夹的图片哈希缓存，只为新增的图片计算哈希
+    index = get_image_hash_index(logger)
+    hashes = HotWordHashes(hot_word_path, logger, index)
+    if len(hashes) >= num_results:
+        logger.info(f"目录 {hot_word_path} 中已有 {len(hashes)} 张图片，不再下载新图片。")
         return
 
-    # 计算现有图片的哈希值
-    existing_hashes = {}
-    for img_name in existing_images:
-        img_path = os.path.join(hot_word_path, img_name)
-        try:
-            with Image.open(img_path) as img:
-                img_hash = imagehash.average_hash(img)
-                existing_hashes[img_hash] = img_name
-        except Exception as e:
-            logger.error(f"计算图片 {img_path} 哈希值时发生异常: {e}")
-
-    with DDGS(proxy=os.getenv("PROXY_URL"), timeout=20) as ddgs:
-        img_results = ddgs.images(query, max_results=6, size="Large")
-        # 下载并保存图片
-        hot_word = os.path.splitext(os.path.basename(hot_word_path))[0]
-        for i, result in enumerate(img_results):
-            image_url = result["image"]
-            try:
-                response = requests.get(image_url)
-                if response.status_code == 200:
-                    # 打开图片并计算哈希值
-                    img = Image.open(BytesIO(response.content))
-                    new_hash = imagehash.average_hash(img)
+    img_results = get_search_client().search_images(query, max_results=6, size="Large", logger=logger)
+    # 并发下载图片，同一时刻最多 IMAGE_FETCH_WORKERS 个请求；哈希比对和保存在当前线程中按完成顺序进行
+    session, executor = _get_image_session()
+    hot_word = os.path.splitext(os.path.basename(hot_word_path))[0]
+    candidates = iter(enumerate(img_results))
+    in_flight = {}
 
-                    # 检查是否已有相似图片
-                    if any(new_hash - existing_hash < 10 for existing_hash in existing_hashes):
-                        logger.info(f"图片 {image_url} 与目录中的图片相似，不保存。")
-                        continue
+    def schedule():
+        # 已保存的图片加上正在下载的图片足够时，不再提交新的下载
+        while len(in_flight) < _image_fetch_workers() and len(hashes) + len(in_flight) < num_results:
+            try:
+                i, result = next(candidates)
+            except StopIteration:
+                return
+            in_flight[executor.submit(_fetch_image, session, result["image"])] = (i, result["image"])
+
+    schedule()
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            i, image_url = in_flight.pop(future)
+            try:
+                content, new_hash = future.result()
+            except Exception as e:
+                logger.info(f"下载图片 {image_url} 时发生异常: {e}")
+                continue
+            if len(hashes) >= num_results:
+                continue
 
-                    # 保存图片
+            # 检查是否已有相似图片
+            if hashes.find(new_hash) is not None:
+                logger.info(f"图片 {image_url} 与目录中的图片相似，不保存。")
+                continue
 
-                    save_path = os.path.join(hot_word_path, f"{hot_word.replace(' ', '_')}_{search_web_call_count}_{i + 1}.jpg")
+            try:
+                # 保存图片，其他热词文件夹中已有同一张图片时直接复用，不重复存储
+                file_name = f"{hot_word.replace(' ', '_')}_{search_web_call_count}_{i + 1}.jpg"
+                save_path = os.path.join(hot_word_path, file_name)
+                duplicate = index.find(new_hash, exclude_dir=hot_word_path) if index is not None else None
+                if duplicate is not None:
+                    link_or_copy(duplicate, save_path)
+                    logger.info(f"图片 {image_url} 与已保存的 {duplicate} 相同，复用已有文件: {save_path}")
+                else:
                     with open(save_path, "wb") as file:
-                        file.write(response.content)
+                        file.write(content)
                     logger.info(f"图片已保存到: {save_path}")
-
-                    # 更新现有哈希值
-                    existing_hashes[new_hash] = os.path.basename(save_path)
-
-                    # 再次检查图片数量，避免超过10个
-                    existing_images = [f for f in os.listdir(hot_word_path) if f.endswith(('.jpg', '.png'))]
-                    if len(existing_images) >= num_results:
-                        logger.info(f"目录 {hot_word_path} 中已有 {len(existing_images)} 张图片，不再下载新图片。")
-                        break
-                else:
-                    logger.info(f"无法下载图片 {image_url}，状态码: {response.status_code}")
+                # 更新哈希缓存和全局索引
+                hashes.add(file_name, new_hash)
             except Exception as e:
-                logger.info(f"下载图片 {image_url} 时发生异常: {e}")
+                logger.info(f"保存图片 {image_url} 时发生异常: {e}")
+        if len(hashes) >= num_results:
+            logger.info(f"目录 {hot_word_path} 中已有 {len(hashes)} 张图片，不再下载新图片。")
+            for future in in_flight:
+                future.cancel()
+            return
+        schedule()
@@ -0,0 +1,183 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from duckduckgo_search import DDGS
+from dotenv import load_dotenv
+
+from agent.utils.cache import SqliteTTLCache
+from core.rate_limiter import get_rate_limiter
+from webui.utils.constant import root_dir
+
+load_dotenv()
+
+__all__ = ["SearchClient", "get_search_client", "normalize_query"]
+
+SERPER_SEARCH_URL = "https://google.serper.dev/search"
+
+
+def normalize_query(query):
+    """统一全半角、大小写、空白和首尾标点，使近似相同的查询命中同一条缓存"""
+    query = unicodedata.normalize("NFKC", query or "").lower()
+    query = re.sub(r"\s+", " ", query)
+    return query.strip(" \t\n\"'“”‘’.,，。?？!！")
+
+
+def _create_cache():
+    if os.getenv("SEARCH_CACHE", "true").lower() != "true":
+        return None
+    return SqliteTTLCache(os.path.join(root_dir, os.getenv("SEARCH_CACHE_PATH", "search_cache.db")),
+                          ttl=float(os.getenv("SEARCH_CACHE_TTL_HOURS", "12")) * 3600,
+                          max_bytes=int(float(os.getenv("SEARCH_CACHE_MAX_MB", "50")) * 1024 * 1024))
+
+
+class _Backend:
+    """单个搜索后端：一个可复用的会话 + 一个并发上限"""
+
+    def __init__(self, name, max_concurrency):
+        self.name = name
+        self.semaphore = threading.BoundedSemaphore(max(max_concurrency, 1))
+
+
+class SearchClient:
+    """
+    搜索客户端：每个后端只创建一个会话并在多次查询间复用（Serper 使用带连接池的 requests.Session，
+    DuckDuckGo 使用同一个 DDGS 实例），通过每个后端各自的并发上限和全局令牌桶（RATE_LIMIT_SERPER / RATE_LIMIT_DDG）控制请求
+    search_many 可一次提交多个查询，在线程池中并发执行，按输入顺序返回结果
+    网页和图片搜索结果按 (后端, 规范化查询, 结果数量) 缓存在 SQLite 中，跨热词、跨任务复用
+    """
+
+    def __init__(self, api_key=None, proxy_url=None, max_workers=None):
+        self.api_key = api_key if api_key is not None else os.getenv("SERPAPI_API_KEY", None)
+        self.proxy_url = proxy_url if proxy_url is not None else os.getenv("PROXY_URL")
+        self.serper = _Backend("serper", int(os.getenv("SERPER_CONCURRENCY", "4")))
+        # DuckDuckGo 限流严格，且 DDGS 实例不保证线程安全，默认串行
+        self.ddg = _Backend("ddg", int(os.getenv("DDG_CONCURRENCY", "1")))
+        self.max_workers = max_workers or int(os.getenv("SEARCH_WORKERS", "4"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="search")
+        self._session = None
+        self._ddgs = None
+        self._lock = threading.Lock()
+        self.cache = _create_cache()
+
+    @property
+    def backend(self):
+        """当前使用的网页搜索后端：配置了 SERPAPI_API_KEY 时为 serper，否则为 ddg"""
+        return "serper" if self.api_key else "ddg"
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                if self.proxy_url:
+                    session.proxies = {"http": self.proxy_url, "https": self.proxy_url}
+                session.headers.update({"X-API-KEY": self.api_key, "Content-Type": "application/json"})
+                self._session = session
+            return self._session
+
+    def _get_ddgs(self):
+        with self._lock:
+            if self._ddgs is None:
+                self._ddgs = DDGS(proxy=self.proxy_url, timeout=20)
+            return self._ddgs
+
+    def _search_serper(self, query, num_results):
+        session = self._get_session()
+        with self.serper.semaphore:
+            get_rate_limiter("serper").acquire()
+            response = session.post(SERPER_SEARCH_URL, json={"q": query, "engine": "google", "num": num_results},
+                                    timeout=20)
+        if response.status_code != 200:
+            raise RuntimeError(f"无法获取搜索结果。状态码: {response.status_code}")
+        return [{'title': r['title'], 'snippet': r.get('snippet', ''), 'link': r['link']}
+                for r in response.json().get("organic", [])]
+
+    def _search_ddg(self, query, num_results):
+        ddgs = self._get_ddgs()
+        with self.ddg.semaphore:
+            get_rate_limiter("ddg").acquire()
+            results = ddgs.text(query, max_results=num_results)
+        return [{'title': r['title'], 'snippet': r['body'], 'link': r['href']} for r in results or []]
+
+    def _cached(self, kind, query, num_results, fetch, logger=None):
+        """先查缓存，未命中时调用 fetch 并写入缓存（失败结果不缓存）"""
+        if self.cache is None:
+            return fetch()
+        key = json.dumps([kind, self.backend if kind == "web" else "ddg", normalize_query(query), num_results],
+                         ensure_ascii=False)
+        hit, value = self.cache.get(key)
+        if logger:
+            stats = self.cache.stats()
+            logger.info(f"搜索缓存{'命中' if hit else '未命中'}：{query}（累计命中 {stats['hits']} 次，"
+                        f"未命中 {stats['misses']} 次，命中率 {stats['hit_rate']:.0%}）")
+        if hit:
+            return value
+        value = fetch()
+        self.cache.set(key, value)
+        return value
+
+    def search(self, query, num_results=3, logger=None):
+        """
+        执行一次网页搜索
+        :return: [{'title', 'snippet', 'link'}, ...]，失败时抛出异常
+        """
+        fetch = self._search_serper if self.backend == "serper" else self._search_ddg
+        return self._cached("web", query, num_results, lambda: fetch(query, num_results), logger)
+
+    def search_many(self, queries, num_results=3, logger=None):
+        """
+        并发执行多个查询
+        :return: 与 queries 顺序一致的结果列表，单个查询失败时对应位置为异常对象
+        """
+        futures = [self._executor.submit(self.search, query, num_results, logger) for query in queries]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _search_images(self, query, max_results, size):
+        ddgs = self._get_ddgs()
+        with self.ddg.semaphore:
+            get_rate_limiter("ddg").acquire()
+            return ddgs.images(query, max_results=max_results, size=size) or []
+
+    def search_images(self, query, max_results=6, size="Large", logger=None):
+        """通过 DuckDuckGo 搜索图片，返回结果列表（每项含 image 地址）"""
+        return self._cached(f"image_{size}", query, max_results,
+                            lambda: self._search_images(query, max_results, size), logger)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._ddgs is not None:
+                self._ddgs.__exit__(None, None, None)
+                self._ddgs = None
+            if self.cache is not None:
+                self.cache.close()
+        self._executor.shutdown(wait=False)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_search_client():
+    """获取全局唯一的搜索客户端，所有热词研究共用同一组会话和并发上限"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SearchClient()
+    return _client
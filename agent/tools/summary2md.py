@@ -136,7 +136,7 @@ def _insert_random_image(markdown_content: str, image_dir: str) -> str:
     title_line = lines[0]
     rest_lines = '\n'.join(lines[1:])
 
-    image_files = [f for f in os.listdir(image_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    image_files = [f for f in os.listdir(image_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
     if not image_files:
         return markdown_content
 
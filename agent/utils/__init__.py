@@ -1,3 +1,4 @@
-__all__ =["call_llm","get_images"]
+__all__ =["call_llm","get_images","get_llm_client"]
 from agent.utils.call_llm import call_llm
+from agent.utils.llm_client import get_llm_client
 from agent.utils.get_images import get_images
\ No newline at end of file
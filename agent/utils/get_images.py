@@ -17,5 +17,5 @@ def get_images(hot_word_folder):
     image_dir = hot_word_folder
     if not os.path.exists(hot_word_folder):
         return []
-    images = [os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.endswith(('.jpg', '.png'))]
+    images = [os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.endswith(('.jpg', '.png', '.webp'))]
     return images
\ No newline at end of file
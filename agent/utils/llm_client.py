@@ -0,0 +1,515 @@
+import asyncio
+import hashlib
+import json
+import logging as _logging
+import os
+import random
+import threading
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from PIL import Image
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from agent.utils.cache import SqliteTTLCache
+from agent.utils.llm_pool import TEXT, VISION, EndpointPool, load_endpoints
+from agent.utils.structured import JSON_HINT, format_params, structured_enabled
+from core.rate_limiter import get_rate_limiter
+from webui.utils.constant import root_dir
+
+load_dotenv()
+
+__all__ = ["LLMClient", "get_llm_client", "convert_image_to_base64", "yaml_block_closed", "json_object_closed"]
+
+# 遇到以下状态码时按退避策略重试
+RETRY_STATUS = (429, 500, 502, 503, 504)
+YAML_FENCE = "```yaml"
+
+
+def _create_cache():
+    if os.getenv("LLM_CACHE", "true").lower() != "true":
+        return None
+    return SqliteTTLCache(os.path.join(root_dir, os.getenv("LLM_CACHE_PATH", "llm_cache.db")),
+                          ttl=float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600,
+                          max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024))
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def yaml_block_closed(text):
+    """文本中的 ```yaml 代码块是否已经结束"""
+    start = text.find(YAML_FENCE)
+    return start != -1 and text.find("```", start + len(YAML_FENCE)) != -1
+
+
+def json_object_closed(text):
+    """文本中第一个顶层 JSON 对象是否已经结束（按花括号深度判断，忽略字符串中的花括号）"""
+    depth, in_string, escaped = 0, False, False
+    for char in text[max(text.find("{"), 0):]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return True
+    return False
+
+
+def _iter_ollama(response):
+    """解析 Ollama 的 NDJSON 流，逐段返回 (文本, 总 token 数)，总 token 数只在最后一段中给出"""
+    for line in response.iter_lines():
+        if not line:
+            continue
+        data = json.loads(line)
+        if "error" in data:
+            raise RuntimeError(data["error"])
+        tokens = data.get("prompt_eval_count", 0) + data.get("eval_count", 0) if data.get("done") else None
+        yield data.get("response", ""), tokens
+
+
+def _iter_openai(response):
+    """解析 OpenAI 兼容接口的 SSE 流，逐段返回 (文本, 总 token 数)"""
+    for line in response.iter_lines():
+        line = line.decode("utf-8") if isinstance(line, bytes) else line
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        data = json.loads(data)
+        choices = data.get("choices") or []
+        piece = (choices[0].get("delta") or {}).get("content") or "" if choices else ""
+        yield piece, (data.get("usage") or {}).get("total_tokens")
+
+
+def convert_image_to_base64(image_path, quality=80) -> str:
+    """将图片转换为Base64编码，支持多种格式，并记录日志。"""
+    with Image.open(image_path) as img:
+        format = img.format or "JPEG"
+        byte_stream = BytesIO()
+
+        if format.upper() == "PNG" and img.mode == "RGBA":
+            img.save(byte_stream, format=format)
+        else:
+            img = img.convert("RGB")
+            img.save(byte_stream, format=format, quality=quality)
+
+        image_bytes = byte_stream.getvalue()
+        base64_bytes = b64encode(image_bytes)
+        return base64_bytes.decode('utf-8')
+
+
+def _build_evaluation_payload(prompt, model_name, image_base64='', ) -> dict:
+    """构建 OpenAI 兼容接口的请求负载。"""
+    content = [
+        {
+            "type": "text",
+            "text": prompt
+        }
+    ]
+
+    # 仅当 image_base64 存在时添加图片内容
+    if image_base64 != '':
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{image_base64}"
+            }
+        })
+
+    return {
+        "model": f"{model_name}",
+        "messages": [
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+        "stream": False
+    }
+
+
+class _StatusError(RuntimeError):
+    """模型端点返回了非 200 状态码"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMClient:
+    """
+    LLM 客户端：所有模型端点（本地 Ollama、云端 OpenAI 兼容接口，见 agent.utils.llm_pool）共用一个带连接池的 requests.Session，
+    每个端点各有并发上限，避免并行研究把单台 GPU 服务器压垮
+    - 按能力（有图片时为 vision，否则为 text）从端点池中选择已分配请求最少的端点，端点失败时转移到下一个候选端点
+    - call：在当前线程中同步调用
+    - submit / map：提交到线程池并发调用，map 按输入顺序返回结果
+    - acall / amap：在协程中调用，等待期间不阻塞事件循环
+    请求带超时，遇到连接错误、超时或 429/5xx 时按指数退避重试（还有其他候选端点时，连接失败直接转移）
+    成功的响应按 hash(端点类型, 模型, 提示词, 图片内容摘要, 生成参数) 缓存在 SQLite 中，相同的调用直接返回缓存，
+    需要重新采样的调用方传入 cache=False 跳过缓存；savings / log_savings 统计缓存节省的 token 数和耗时
+    只需要 ```yaml 代码块的调用方传入 stop_after_yaml=True，使用流式响应并在代码块结束时立即停止生成（LLM_STREAM=false 时关闭），
+    结构化输出时改为在顶层 JSON 对象结束时停止；
+    stream 逐段返回生成的文本
+    传入 schema（agent.utils.structured.SCHEMAS 中的名称）时要求模型按 JSON Schema 输出（LLM_STRUCTURED=false 时关闭）
+    metrics / log_metrics 统计每个端点的请求数、失败数和耗时，check_health 检查所有端点
+    """
+
+    def __init__(self, max_workers=None):
+        # 连接超时和读取超时（秒）
+        self.timeout = (float(os.getenv("LLM_CONNECT_TIMEOUT", "10")), float(os.getenv("LLM_TIMEOUT", "300")))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.backoff = float(os.getenv("LLM_BACKOFF", "2"))
+        self.stream_enabled = os.getenv("LLM_STREAM", "true").lower() == "true"
+        self.max_workers = max_workers or int(os.getenv("LLM_WORKERS", "4"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm")
+        endpoints = load_endpoints()
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(len(endpoints), 1), pool_maxsize=self.max_workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self._session = session
+        self.pool = EndpointPool(endpoints, session, timeout=(self.timeout[0], 10))
+        self.cache = _create_cache()
+        self._savings = {"hits": 0, "misses": 0, "tokens_saved": 0, "seconds_saved": 0.0}
+        self._savings_lock = threading.Lock()
+
+    def route(self, image_path='', kind=None):
+        """
+        按能力选择候选端点：有图片时需要 vision 标签，否则需要 text 标签
+        :param kind: 只使用该类型（local / cloud）的端点，为 None 时不限
+        :return: 按使用顺序排列的端点列表，没有可用端点时为空
+        """
+        return self.pool.candidates(VISION if image_path != "" else TEXT, kind)
+
+    def call(self, prompt, logger=None, image_path='', cache=True, params=None, stop_after_yaml=False, schema=None,
+             kind=None):
+        """
+        同步调用 LLM
+        :param cache: 是否使用响应缓存，需要重新采样时传入 False
+        :param params: 额外的生成参数，合并到请求负载中，并作为缓存键的一部分
+        :param stop_after_yaml: 是否在 ```yaml 代码块结束时提前停止生成，之后的内容不会返回
+        :param schema: 结构化输出的名称，传入时约束模型按对应的 JSON Schema 输出，
+                       此时 stop_after_yaml 改为在顶层 JSON 对象结束时提前停止生成
+        :param kind: 只使用该类型（local / cloud）的端点
+        :return: (响应文本, 是否成功)，没有可用模型时返回 (None, None)
+        """
+        logger = logger or _logging.getLogger(__name__)
+        candidates = self.route(image_path, kind)
+        if not candidates:
+            return None, None
+        closed = yaml_block_closed
+        if schema is not None and structured_enabled():
+            prompt += JSON_HINT
+            closed = json_object_closed
+        else:
+            schema = None
+
+        def endpoint_params(endpoint):
+            # 结构化输出参数与端点类型有关（Ollama format / OpenAI response_format）
+            return {**(params or {}), **format_params(endpoint.kind, schema)} if schema is not None else params
+
+        stop = closed if stop_after_yaml and self.stream_enabled else None
+        keys = []
+        if cache and self.cache:
+            image_digest = _file_digest(image_path) if image_path != "" else ""
+
+            def cache_key(endpoint):
+                return self._cache_key(endpoint.kind, endpoint.model, prompt, image_digest,
+                                       endpoint_params(endpoint), stop is not None)
+
+            # 任一候选端点（相同类型和模型）已有缓存时直接返回
+            keys = list(dict.fromkeys(cache_key(endpoint) for endpoint in candidates))
+            for key in keys:
+                hit, value = self.cache.get(key)
+                if hit:
+                    self._record(hit=True, tokens=value["tokens"], seconds=value["seconds"])
+                    logger.info(f"LLM 缓存命中，节省 {value['tokens']} 个 token、{value['seconds']:.1f} 秒")
+                    return value["response"], True
+        start = time.monotonic()
+        response, success, tokens, endpoint = self._call(image_path, kind, prompt, logger, endpoint_params, stop)
+        if keys:
+            self._record(hit=False)
+            if success:
+                self.cache.set(cache_key(endpoint), {"response": response, "tokens": tokens,
+                                                     "seconds": time.monotonic() - start})
+        return response, success
+
+    def _cache_key(self, kind, model, prompt, image_digest, params, truncated=False):
+        raw = json.dumps([kind, model, prompt, image_digest, params or {}, truncated], ensure_ascii=False,
+                         sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _record(self, hit, tokens=0, seconds=0.0):
+        with self._savings_lock:
+            self._savings["hits" if hit else "misses"] += 1
+            self._savings["tokens_saved"] += tokens or 0
+            self._savings["seconds_saved"] += seconds
+
+    def savings(self, since=None):
+        """
+        缓存累计命中次数、未命中次数、节省的 token 数和耗时（秒）
+        :param since: 运行开始时 savings() 的返回值，传入时只统计这之后的部分
+        """
+        with self._savings_lock:
+            current = dict(self._savings)
+        if since:
+            current = {k: v - since.get(k, 0) for k, v in current.items()}
+        return current
+
+    def log_savings(self, logger, since=None):
+        """输出本次运行的缓存效果，参数同 savings"""
+        current = self.savings(since)
+        if current["hits"] or current["misses"]:
+            logger.info(f"LLM 缓存命中 {current['hits']} 次，未命中 {current['misses']} 次，"
+                        f"节省 {current['tokens_saved']} 个 token、{current['seconds_saved']:.1f} 秒")
+        return current
+
+    def metrics(self):
+        """每个端点的状态、请求数、失败数、失败率和耗时，见 EndpointPool.metrics"""
+        return self.pool.metrics()
+
+    def log_metrics(self, logger):
+        """输出每个端点的请求数、失败数和耗时"""
+        return self.pool.log_metrics(logger)
+
+    def check_health(self):
+        """检查所有端点，返回 {端点名称: 是否健康}"""
+        return self.pool.check_health()
+
+    def submit(self, prompt, logger=None, image_path='', **kwargs):
+        """提交到线程池异步调用，返回 concurrent.futures.Future，kwargs 同 call"""
+        return self._executor.submit(self.call, prompt, logger, image_path, **kwargs)
+
+    def map(self, calls, logger=None, **kwargs):
+        """
+        并发调用多次 LLM
+        :param calls: 提示词，或 (提示词, 图片路径) 元组的列表
+        :return: 与 calls 顺序一致的 [(响应文本, 是否成功), ...]
+        """
+        futures = [self.submit(prompt, logger, image_path, **kwargs)
+                   for prompt, image_path in map(self._unpack, calls)]
+        return [future.result() for future in futures]
+
+    async def acall(self, prompt, logger=None, image_path='', **kwargs):
+        """在协程中调用 LLM"""
+        return await asyncio.wrap_future(self.submit(prompt, logger, image_path, **kwargs))
+
+    async def amap(self, calls, logger=None, **kwargs):
+        """在协程中并发调用多次 LLM，按输入顺序返回结果"""
+        return await asyncio.gather(*(self.acall(prompt, logger, image_path, **kwargs)
+                                      for prompt, image_path in map(self._unpack, calls)))
+
+    @staticmethod
+    def _unpack(call):
+        return (call, '') if isinstance(call, str) else tuple(call)
+
+    @staticmethod
+    def _is_endpoint_failure(error):
+        """连接失败、超时和 429/5xx 属于端点故障，计入端点的健康状态"""
+        return isinstance(error, requests.RequestException) or getattr(error, "status", None) in RETRY_STATUS
+
+    def _post(self, endpoint, payload, logger, stream=False, retry_connect=True):
+        """
+        发送请求，失败时按指数退避重试（调用方需持有端点的并发信号量）
+        :param retry_connect: 连接失败时是否重试，还有其他候选端点时传入 False，直接转移到其他端点
+        :return: 状态码为 200 的响应；重试用尽后返回最后一次的响应，或抛出最后一次的异常
+        """
+        headers = {'Content-Type': 'application/json', **(endpoint.headers() or {})}
+        for attempt in range(self.max_retries + 1):
+            response, error = None, None
+            get_rate_limiter(f"llm_{endpoint.kind}").acquire()
+            try:
+                response = self._session.post(endpoint.url, json=payload, headers=headers, timeout=self.timeout,
+                                              stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if error is None and response.status_code not in RETRY_STATUS:
+                return response
+            connect_failed = isinstance(error, requests.ConnectionError) and not isinstance(error, requests.Timeout)
+            if attempt == self.max_retries or (connect_failed and not retry_connect):
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+            delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt + random.random()
+            logger.warning(f"第 {attempt + 1} 次调用 {endpoint.name} 失败（{error or response.status_code}），"
+                           f"{delay:.1f} 秒后重试")
+            time.sleep(delay)
+
+    def _request(self, endpoint, prompt, logger, image_path='', params=None, stream=False, retry_connect=True):
+        """构建本地（Ollama）或云端（OpenAI 兼容接口）的请求负载并发送，状态码不为 200 时抛出 _StatusError"""
+        logger.info(f"使用{'本地' if endpoint.kind == 'local' else '云端'}模型{endpoint.model}（{endpoint.name}）,"
+                    f"进行{'视觉' if image_path != '' else '语言(非视觉)'}操作")
+        image_base64 = convert_image_to_base64(image_path) if image_path != "" else ''
+        if endpoint.kind == "local":
+            payload = {"model": endpoint.model, "prompt": prompt, "stream": stream}
+            if image_base64:
+                payload["images"] = [image_base64]
+        else:
+            payload = _build_evaluation_payload(prompt, endpoint.model, image_base64)
+            payload["stream"] = stream
+        payload.update(params or {})
+        response = self._post(endpoint, payload, logger, stream=stream, retry_connect=retry_connect)
+        if response.status_code == 400 and "response_format" in payload:
+            # 部分 OpenAI 兼容服务不支持 response_format，去掉后重试一次（输出仍按提示词要求的格式解析）
+            response.close()
+            logger.warning(f"{endpoint.name} 不支持 response_format，去掉结构化输出约束后重试")
+            payload.pop("response_format")
+            response = self._post(endpoint, payload, logger, stream=stream, retry_connect=retry_connect)
+        if response.status_code != 200:
+            response.close()
+            raise _StatusError(f"无法从模型获取响应。状态码: {response.status_code}", response.status_code)
+        return response
+
+    def _call(self, image_path, kind, prompt, logger, endpoint_params, stop):
+        """
+        依次选择端点调用，端点失败时转移到下一个候选端点
+        :return: (响应文本, 是否成功, 消耗的 token 数, 返回响应的端点)
+        """
+        capability = VISION if image_path != "" else TEXT
+        tried = []
+        while True:
+            endpoint = self.pool.acquire(capability, kind, exclude=tried)
+            if endpoint is None:
+                return "错误: 调用LLM时发生异常。", False, 0, None
+            tried.append(endpoint)
+            # 还有其他候选端点时，连接失败不在当前端点上重试
+            retry_connect = len(tried) >= len(self.route(image_path, kind))
+            start = time.monotonic()
+            try:
+                response, tokens = self._call_endpoint(endpoint, prompt, logger, image_path,
+                                                       endpoint_params(endpoint), stop, retry_connect)
+            except Exception as e:
+                self.pool.release(endpoint, time.monotonic() - start, error=e,
+                                  transport=self._is_endpoint_failure(e))
+                logger.error(f"模型端点 {endpoint.name} 调用失败: {e}")
+                continue
+            self.pool.release(endpoint, time.monotonic() - start)
+            return response, True, tokens, endpoint
+
+    def stream(self, prompt, logger=None, image_path='', params=None, kind=None):
+        """
+        流式调用 LLM，逐段返回生成的文本（Ollama 为 NDJSON，云端为 SSE）
+        开始生成之前端点失败时转移到下一个候选端点；
+        调用方提前结束迭代（break 或关闭生成器）时立即断开连接，服务端随之停止生成
+        """
+        logger = logger or _logging.getLogger(__name__)
+        capability = VISION if image_path != "" else TEXT
+        tried, last_error = [], None
+        while True:
+            endpoint = self.pool.acquire(capability, kind, exclude=tried)
+            if endpoint is None:
+                if last_error is not None:
+                    raise last_error
+                return
+            tried.append(endpoint)
+            start = time.monotonic()
+            with endpoint.semaphore:
+                try:
+                    response = self._request(endpoint, prompt, logger, image_path, params, stream=True,
+                                             retry_connect=len(tried) >= len(self.route(image_path, kind)))
+                except Exception as e:
+                    self.pool.release(endpoint, time.monotonic() - start, error=e,
+                                      transport=self._is_endpoint_failure(e))
+                    logger.error(f"模型端点 {endpoint.name} 调用失败: {e}")
+                    last_error = e
+                    continue
+                error = None
+                try:
+                    for piece, _ in (_iter_ollama if endpoint.kind == "local" else _iter_openai)(response):
+                        yield piece
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    response.close()
+                    self.pool.release(endpoint, time.monotonic() - start, error=error,
+                                      transport=self._is_endpoint_failure(error))
+                return
+
+    @staticmethod
+    def _consume(response, chunks, stop, logger):
+        """
+        读取流式响应，stop(已生成的文本) 为真时立即断开连接
+        :return: (已生成的文本, 消耗的 token 数)，服务端未返回用量时按收到的分片数估算
+        """
+        text, tokens, count = "", None, 0
+        try:
+            for piece, total in chunks:
+                text += piece
+                count += 1
+                tokens = total or tokens
+                if stop(text):
+                    logger.info("输出已完整，提前停止生成")
+                    break
+        finally:
+            response.close()
+        return text, tokens or count
+
+    def _call_endpoint(self, endpoint, prompt, logger, image_path='', params=None, stop=None, retry_connect=True):
+        """
+        调用一个端点：本地 Ollama 模型或云端模型（OpenAI 兼容接口），支持视觉与非视觉操作
+        :param stop: 传入时使用流式响应，stop(已生成的文本) 为真时提前停止生成
+        :return: (响应文本, 消耗的 token 数)，失败时抛出异常
+        """
+        with endpoint.semaphore:
+            response = self._request(endpoint, prompt, logger, image_path, params, stream=stop is not None,
+                                     retry_connect=retry_connect)
+            if stop is not None:
+                chunks = _iter_ollama(response) if endpoint.kind == "local" else _iter_openai(response)
+                text, tokens = self._consume(response, chunks, stop, logger)
+                logger.info(f"模型返回信息{text}")
+                return text, tokens
+            data = response.json()
+        if endpoint.kind == "local":
+            logger.info(f"模型返回信息{data.get('response')}")
+            return data.get("response", ""), data.get("prompt_eval_count", 0) + data.get("eval_count", 0)
+        choices = data.get("choices", [])
+        if not choices:  # 确保 choices 列表非空
+            raise RuntimeError("API 响应中没有 choices 数据")
+        message = choices[0].get("message", {})
+        content = message.get("content", "无内容")  # 获取 content 字段，若不存在则返回默认值
+        reasoning_content = message.get("reasoning_content", "无推理内容")  # 获取 reasoning_content 字段
+        logger.info(f"API 响应: Content={content}\n, Reasoning Content={reasoning_content}")
+        return content, (data.get("usage") or {}).get("total_tokens", 0)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """获取全局唯一的 LLM 客户端，所有节点共用同一个连接池和并发上限"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+    return _client
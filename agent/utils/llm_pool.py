@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+__all__ = ["TEXT", "VISION", "Endpoint", "EndpointPool", "load_endpoints"]
+
+# 模型能力标签
+TEXT = "text"
+VISION = "vision"
+# 成功请求耗时的指数移动平均系数
+_LATENCY_ALPHA = 0.3
+
+
+class Endpoint:
+    """
+    一个模型服务端点：本地（Ollama，kind=local）或云端（OpenAI 兼容接口，kind=cloud）
+    tags 为模型能力标签（text / vision），concurrency 为该端点的最大并发请求数
+    """
+
+    def __init__(self, kind, url, model, tags, concurrency=1, api_key=None):
+        self.kind = kind
+        self.url = url
+        self.model = model
+        self.tags = set(tags)
+        self.concurrency = max(concurrency, 1)
+        self.api_key = api_key
+        self.name = f"{kind}:{urlsplit(url).netloc}/{model}"
+        self.semaphore = threading.BoundedSemaphore(self.concurrency)
+        # 已分配给该端点的请求数（包括正在等待并发信号量的请求）
+        self.outstanding = 0
+        self.healthy = True
+        self.down_until = 0.0
+        self.consecutive_errors = 0
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.latency = None
+        self.last_error = ""
+
+    def probe_url(self):
+        """健康检查地址：Ollama 为 /api/tags，OpenAI 兼容接口为 .../models"""
+        parts = urlsplit(self.url)
+        if self.kind == "local":
+            path = "/api/tags"
+        else:
+            path = parts.path.rsplit("/chat/completions", 1)[0] + "/models"
+        return urlunsplit((parts.scheme, parts.netloc, path, "", ""))
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
+
+
+def _parse_endpoint(entry):
+    """解析 类型|地址|模型|能力标签|并发上限|API Key 环境变量名，后两项可省略"""
+    fields = [field.strip() for field in entry.split("|")]
+    if len(fields) < 4 or fields[0] not in ("local", "cloud"):
+        raise ValueError(f"LLM_ENDPOINTS 格式错误: {entry}")
+    kind, url, model, tags = fields[:4]
+    default_concurrency = os.getenv("LLM_LOCAL_CONCURRENCY", "1") if kind == "local" \
+        else os.getenv("LLM_CLOUD_CONCURRENCY", "4")
+    concurrency = int(fields[4]) if len(fields) > 4 and fields[4] else int(default_concurrency)
+    key_env = fields[5] if len(fields) > 5 and fields[5] else ("CLOUD_API_KEY" if kind == "cloud" else "")
+    return Endpoint(kind, url, model, [tag.strip() for tag in tags.split(",") if tag.strip()], concurrency,
+                    os.getenv(key_env) if key_env else None)
+
+
+def load_endpoints():
+    """
+    读取模型端点列表
+    LLM_ENDPOINTS 为分号分隔的多个端点，每个端点为 类型|地址|模型|能力标签|并发上限|API Key 环境变量名；
+    未配置时使用 LOCAL_LLM_URL / LOCAL_MODEL_NAME（gemma3 支持视觉）和 CLOUD_API_URL / CLOUD_MODEL_NAME / CLOUD_API_KEY
+    """
+    configured = os.getenv("LLM_ENDPOINTS", "").strip()
+    if configured:
+        return [_parse_endpoint(entry) for entry in configured.split(";") if entry.strip()]
+    endpoints = []
+    local_url, local_model = os.getenv("LOCAL_LLM_URL"), os.getenv("LOCAL_MODEL_NAME") or ""
+    if local_url and local_model:
+        tags = [TEXT, VISION] if "gemma3" in local_model else [TEXT]
+        endpoints.append(Endpoint("local", local_url, local_model, tags,
+                                  int(os.getenv("LLM_LOCAL_CONCURRENCY", "1"))))
+    cloud_url, cloud_model = os.getenv("CLOUD_API_URL"), os.getenv("CLOUD_MODEL_NAME") or ""
+    if cloud_url and cloud_model:
+        endpoints.append(Endpoint("cloud", cloud_url, cloud_model, [TEXT, VISION],
+                                  int(os.getenv("LLM_CLOUD_CONCURRENCY", "4")), os.getenv("CLOUD_API_KEY")))
+    return endpoints
+
+
+class EndpointPool:
+    """
+    模型端点池
+    - 按能力标签筛选端点，优先使用 LLM_PREFER_TEXT / LLM_PREFER_VISION 指定类型（local / cloud）的端点，
+      同类端点中选择已分配请求数占并发上限比例最小的端点，相同时选择最近平均耗时最短的端点
+    - 连续 LLM_ENDPOINT_MAX_FAILURES 次连接失败、超时或 429/5xx 后端点进入 LLM_ENDPOINT_COOLDOWN 秒的冷却期，
+      冷却期内转移到其他端点（包括另一类型的端点，LLM_FAILOVER=false 时不跨类型转移），
+      冷却期结束后先通过健康检查再重新使用；所有端点都不可用时仍会尝试冷却中的端点
+    - metrics / log_metrics 统计每个端点的请求数、失败数和耗时
+    """
+
+    def __init__(self, endpoints, session, timeout=5):
+        self.endpoints = endpoints
+        self._session = session
+        self._timeout = timeout
+        self.max_failures = max(int(os.getenv("LLM_ENDPOINT_MAX_FAILURES", "2")), 1)
+        self.cooldown = float(os.getenv("LLM_ENDPOINT_COOLDOWN", "30"))
+        self.failover = os.getenv("LLM_FAILOVER", "true").lower() == "true"
+        self.prefer = {TEXT: os.getenv("LLM_PREFER_TEXT", "local"), VISION: os.getenv("LLM_PREFER_VISION", "cloud")}
+        self._lock = threading.Lock()
+
+    def candidates(self, capability, kind=None):
+        """按使用顺序返回能处理该能力的端点，kind 不为空时只返回该类型的端点"""
+        with self._lock:
+            return self._ordered(capability, kind)
+
+    def _ordered(self, capability, kind):
+        endpoints = [e for e in self.endpoints if capability in e.tags and (kind is None or e.kind == kind)]
+        preferred = self.prefer.get(capability, "local")
+        if not self.failover and any(e.kind == preferred for e in endpoints):
+            endpoints = [e for e in endpoints if e.kind == preferred]
+        now = time.time()
+        return sorted(endpoints, key=lambda e: (not e.healthy and now < e.down_until,
+                                                e.kind != preferred,
+                                                not e.healthy,
+                                                e.outstanding / e.concurrency,
+                                                e.latency or 0.0))
+
+    def acquire(self, capability, kind=None, exclude=()):
+        """
+        选出一个端点并计入已分配请求数，用完后必须调用 release
+        冷却期已结束的端点先进行健康检查，未通过时继续选择下一个端点
+        :return: 端点，没有可用端点时返回 None
+        """
+        exclude = set(exclude)
+        while True:
+            with self._lock:
+                endpoint = next((e for e in self._ordered(capability, kind) if e not in exclude), None)
+                if endpoint is None:
+                    return None
+                endpoint.outstanding += 1
+            if endpoint.healthy or time.time() < endpoint.down_until or self.check(endpoint):
+                return endpoint
+            with self._lock:
+                endpoint.outstanding -= 1
+            exclude.add(endpoint)
+
+    def release(self, endpoint, seconds, error=None, transport=False):
+        """
+        记录一次请求的结果
+        :param error: 失败原因，成功时为 None
+        :param transport: 是否为连接失败、超时或 429/5xx 等端点故障，只有端点故障计入健康状态
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            endpoint.total_seconds += seconds
+            if error is None:
+                endpoint.consecutive_errors = 0
+                endpoint.healthy = True
+                endpoint.latency = seconds if endpoint.latency is None \
+                    else _LATENCY_ALPHA * seconds + (1 - _LATENCY_ALPHA) * endpoint.latency
+                return
+            endpoint.errors += 1
+            endpoint.last_error = str(error)
+            if transport:
+                endpoint.consecutive_errors += 1
+                if endpoint.consecutive_errors >= self.max_failures:
+                    endpoint.healthy = False
+                    endpoint.down_until = time.time() + self.cooldown
+
+    def check(self, endpoint):
+        """
+        健康检查：Ollama 需能列出模型且包含配置的模型，云端接口需可连接且未返回 401/403/429/5xx
+        :return: 是否健康，结果同时更新端点状态
+        """
+        error = None
+        try:
+            response = self._session.get(endpoint.probe_url(), headers=endpoint.headers(), timeout=self._timeout)
+            if endpoint.kind == "local":
+                if response.status_code != 200:
+                    error = f"状态码: {response.status_code}"
+                else:
+                    names = [m.get("name", "") for m in response.json().get("models", [])]
+                    if not any(endpoint.model in (name, name.split(":")[0]) for name in names):
+                        error = f"未找到模型 {endpoint.model}"
+            elif response.status_code >= 500 or response.status_code in (401, 403, 429):
+                error = f"状态码: {response.status_code}"
+        except (requests.RequestException, ValueError) as e:
+            error = str(e)
+        with self._lock:
+            if error is None:
+                endpoint.healthy = True
+                endpoint.consecutive_errors = 0
+            else:
+                endpoint.healthy = False
+                endpoint.last_error = f"健康检查失败，{error}"
+                endpoint.down_until = time.time() + self.cooldown
+        return error is None
+
+    def check_health(self):
+        """检查所有端点，返回 {端点名称: 是否健康}"""
+        return {endpoint.name: self.check(endpoint) for endpoint in self.endpoints}
+
+    def metrics(self):
+        """每个端点的状态、已分配请求数、请求数、失败数、失败率、平均耗时与最近耗时（秒）、最近一次失败原因"""
+        with self._lock:
+            return [{
+                "name": e.name,
+                "kind": e.kind,
+                "tags": sorted(e.tags),
+                "healthy": e.healthy,
+                "outstanding": e.outstanding,
+                "requests": e.requests,
+                "errors": e.errors,
+                "error_rate": e.errors / e.requests if e.requests else 0.0,
+                "avg_seconds": e.total_seconds / e.requests if e.requests else 0.0,
+                "latency": e.latency or 0.0,
+                "last_error": e.last_error,
+            } for e in self.endpoints]
+
+    def log_metrics(self, logger):
+        metrics = self.metrics()
+        for m in metrics:
+            if not m["requests"] and m["healthy"]:
+                continue
+            logger.info(f"模型端点 {m['name']}（{'正常' if m['healthy'] else '冷却中'}）：请求 {m['requests']} 次，"
+                        f"失败 {m['errors']} 次（{m['error_rate']:.0%}），平均耗时 {m['avg_seconds']:.1f} 秒，"
+                        f"最近耗时 {m['latency']:.1f} 秒"
+                        + (f"，最近一次失败: {m['last_error']}" if m["last_error"] else ""))
+        return metrics
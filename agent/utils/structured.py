@@ -0,0 +1,242 @@
+import json
+import os
+import re
+import threading
+
+import yaml
+from dotenv import load_dotenv
+
+load_dotenv()
+
+__all__ = ["SCHEMAS", "JSON_HINT", "structured_enabled", "format_params", "parse_structured", "parse_stats", "log_parse_stats"]
+
+
+def _string():
+    return {"type": "string"}
+
+
+def _integer():
+    return {"type": "integer"}
+
+
+def _object(properties):
+    return {"type": "object", "properties": properties, "required": list(properties),
+            "additionalProperties": False}
+
+
+# 各节点的结构化输出：schema 为发送给模型的 JSON Schema，essential 为解析结果中必须有实际内容的字段
+SCHEMAS = {
+    "decide_action": {
+        "schema": _object({
+            "thinking": _string(),
+            "action": {"type": "string", "enum": ["search", "answer"]},
+            "reason": _string(),
+            "answer": _string(),
+            "search_query": _string(),
+        }),
+        "essential": ["action"],
+    },
+    "content_summary": {
+        "schema": _object({
+            "highlights": {"type": "array", "items": _object({"title": _string(), "summary": _string(),
+                                                              "link": _string()})},
+            "chinese": _string(),
+            "output": _string(),
+        }),
+        "essential": ["chinese", "output"],
+    },
+    "site_analysis": {
+        "schema": _object({
+            "title": _string(),
+            "summary": _string(),
+            "topics": {"type": "array", "items": _string()},
+            "content_type": _string(),
+        }),
+        "essential": ["summary"],
+    },
+    "image_score": {
+        "schema": _object({
+            "total_score": _integer(),
+            "relevance": _integer(),
+            "attractiveness": _integer(),
+            "visual": _integer(),
+            "emotional": _integer(),
+        }),
+        "essential": ["total_score"],
+    },
+}
+
+# 结构化输出时追加到提示词末尾：提示词中的 yaml 示例只说明字段，实际按 JSON 输出（json_object 模式要求提示词中出现 JSON）
+JSON_HINT = "\n\n请直接输出一个 JSON 对象，字段与上面格式示例中的字段相同，不要输出 ```yaml 代码块或其他内容。"
+
+_stats = {"structured": 0, "yaml": 0, "repaired": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+
+def structured_enabled():
+    return os.getenv("LLM_STRUCTURED", "true").lower() == "true"
+
+
+def format_params(target, name):
+    """
+    构建约束模型输出格式的请求参数
+    本地 Ollama 使用 format 传入 JSON Schema；云端按 LLM_CLOUD_RESPONSE_FORMAT 使用 json_object（默认）或 json_schema，
+    为 off 时不约束；服务返回 400 时客户端会去掉 response_format 重试一次（部分 OpenAI 兼容服务不支持）
+    """
+    schema = SCHEMAS[name]["schema"]
+    if target == "local":
+        return {"format": schema}
+    mode = os.getenv("LLM_CLOUD_RESPONSE_FORMAT", "json_object").lower()
+    if mode == "json_schema":
+        return {"response_format": {"type": "json_schema",
+                                    "json_schema": {"name": name, "schema": schema, "strict": True}}}
+    if mode == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def _record(kind):
+    with _stats_lock:
+        _stats[kind] += 1
+        return dict(_stats)
+
+
+def parse_stats():
+    """解析统计：按 JSON 解析成功、按 yaml 代码块解析成功、修复格式后解析成功、解析失败的次数"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def log_parse_stats(logger):
+    stats = parse_stats()
+    if any(stats.values()):
+        logger.info(f"LLM 输出解析：JSON {stats['structured']} 次，YAML {stats['yaml']} 次，"
+                    f"修复后解析 {stats['repaired']} 次，失败 {stats['failed']} 次")
+    return stats
+
+
+def _fenced_block(text, language):
+    """取出 ```language 代码块的内容，代码块未闭合时取到文本末尾"""
+    fence = f"```{language}"
+    if fence not in text:
+        return None
+    return text.split(fence, 1)[1].split("```", 1)[0].strip()
+
+
+def _json_candidates(text):
+    yield text.strip()
+    block = _fenced_block(text, "json")
+    if block:
+        yield block
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        yield text[start:end + 1]
+
+
+def _repair_yaml(text):
+    text = text.replace("\t", "    ")
+    # 键名后的中文冒号、缺少空格的冒号
+    text = re.sub(r"^(\s*-?\s*[A-Za-z_]+)\s*[:：]\s*", r"\1: ", text, flags=re.M)
+    return text
+
+
+def _yaml_candidates(text):
+    """依次返回 (待解析的 YAML, 是否经过修复)"""
+    block = _fenced_block(text, "yaml")
+    for candidate in ([block] if block else []) + [text]:
+        yield candidate, candidate is not block
+        yield _repair_yaml(candidate), True
+        # 值中多余的引号经常导致 YAML 解析失败
+        yield _repair_yaml(candidate.replace("\"", "").replace("'", "")), True
+
+
+def _extract_fields(text, properties):
+    """最后的兜底：按行提取顶层的 键: 值，支持 | 开头的多行值"""
+    data = {}
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        match = re.match(r"^\s*[\"']?([A-Za-z_]+)[\"']?\s*[:：]\s*(.*)$", line)
+        if not match or match.group(1) not in properties or match.group(1) in data:
+            continue
+        value = match.group(2).strip().strip(",").strip("\"'")
+        if value in ("|", ">", ""):
+            block = []
+            for next_line in lines[index + 1:]:
+                if next_line.strip() and not next_line.startswith((" ", "\t")):
+                    break
+                block.append(next_line.strip())
+            value = "\n".join(block).strip()
+        data[match.group(1)] = value
+    return data
+
+
+def _coerce(value, spec):
+    """按 schema 转换类型，整数字段无法转换时返回 None（视为缺失）"""
+    if spec["type"] == "integer":
+        if isinstance(value, str):
+            match = re.search(r"-?\d+", value)
+            return int(match.group()) if match else None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return int(value)
+    if spec["type"] == "array":
+        if isinstance(value, str):
+            value = [item.strip().strip("\"'") for item in re.split(r"[,，、]", value.strip("[]")) if item.strip()]
+        items = [_coerce(item, spec["items"]) for item in value or []]
+        return [item for item in items if item is not None]
+    if spec["type"] == "object":
+        return _normalize(value if isinstance(value, dict) else {}, spec)
+    return "" if value is None else str(value)
+
+
+def _normalize(data, schema):
+    return {key: _coerce(data.get(key), spec) for key, spec in schema["properties"].items()}
+
+
+def _valid(data, name):
+    if not isinstance(data, dict):
+        return None
+    spec = SCHEMAS[name]
+    try:
+        data = _normalize(data, spec["schema"])
+    except (TypeError, ValueError):
+        return None
+    if any(data[key] is None or data[key] in ("", []) for key in spec["essential"]):
+        return None
+    # 非必需的整数字段无法转换时按 0 处理
+    return {key: 0 if value is None and spec["schema"]["properties"][key]["type"] == "integer" else value
+            for key, value in data.items()}
+
+
+def parse_structured(text, name, logger=None):
+    """
+    解析节点的 LLM 输出：优先按 JSON 解析（结构化输出），失败时依次尝试 yaml 代码块、修复常见格式错误后的 YAML、
+    逐行提取字段，解析结果按 SCHEMAS[name] 补全缺失字段并转换类型
+    :return: 解析后的字典，全部失败时返回 None
+    """
+    text = text or ""
+    for candidate in _json_candidates(text):
+        try:
+            data = _valid(json.loads(candidate), name)
+        except ValueError:
+            continue
+        if data is not None:
+            _record("structured")
+            return data
+    properties = SCHEMAS[name]["schema"]["properties"]
+    for candidate, repaired in _yaml_candidates(text):
+        try:
+            data = _valid(yaml.safe_load(candidate), name)
+        except yaml.YAMLError:
+            continue
+        if data is not None:
+            _record("repaired" if repaired else "yaml")
+            return data
+    data = _valid(_extract_fields(_fenced_block(text, "yaml") or text, properties), name)
+    if data is not None:
+        _record("repaired")
+        return data
+    stats = _record("failed")
+    if logger:
+        logger.error(f"LLM 输出无法解析为 {name}（累计解析失败 {stats['failed']} 次）: {text[:200]}")
+    return None
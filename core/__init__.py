@@ -3,8 +3,21 @@ __all__ = [
     "close_browser",
     "parse_cookie_string",
     "crawl_google_trends_page",
-    "get_logger"
+    "crawl_google_trends_rss",
+    "BrowserContextPool",
+    "get_browser_manager",
+    "warm_browser_enabled",
+    "get_logger",
+    "get_result_sink",
+    "register_result_sink",
+    "ResultSink",
+    "get_keyword_index"
 ]
 from .log_config import get_logger
 from .browser_utils import init_browser, close_browser, parse_cookie_string
-from .crawler import crawl_google_trends_page
\ No newline at end of file
+from .browser_pool import BrowserContextPool
+from .browser_manager import get_browser_manager, warm_browser_enabled
+from .keyword_index import get_keyword_index
+from .result_sink import get_result_sink, register_result_sink, ResultSink
+from .crawler import crawl_google_trends_page
+from .rss_crawler import crawl_google_trends_rss
@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import csv
+import inspect
+import os
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+from webui.utils.constant import root_dir
+from .crawler import crawl_google_trends_page
+from .log_config import get_logger
+from .replay import record_trends_har, replay_page, default_har_path
+
+# 加载.env文件中的环境变量
+load_dotenv()
+
+__all__ = ["RoundTripStats", "PageProbe", "run_benchmark", "format_results"]
+
+# Playwright 方法对应的采集阶段
+PHASES = {
+    "goto": "页面导航",
+    "query_selector_all": "等待表格",
+    "evaluate": "批量提取",
+    "click": "点击热词",
+    "wait_for_function": "等待关联新闻",
+    "wait_for_load_state": "等待关联新闻",
+    "route": "注册路由",
+    "unroute": "注册路由",
+}
+
+
+class RoundTripStats:
+    """统计每个 Playwright 异步调用（一次浏览器往返）的次数和耗时"""
+
+    def __init__(self):
+        self.calls = {}
+
+    async def timed(self, name, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            count, total, longest = self.calls.get(name, (0, 0.0, 0.0))
+            elapsed = time.perf_counter() - start
+            self.calls[name] = (count + 1, total + elapsed, max(longest, elapsed))
+
+    @property
+    def round_trips(self):
+        return sum(count for count, _, _ in self.calls.values())
+
+    def phases(self):
+        """按采集阶段汇总：{阶段: (次数, 总耗时)}"""
+        phases = {}
+        for name, (count, total, _) in self.calls.items():
+            phase = PHASES.get(name, "其他调用")
+            phase_count, phase_total = phases.get(phase, (0, 0.0))
+            phases[phase] = (phase_count + count, phase_total + total)
+        return phases
+
+
+def _is_locator(obj):
+    return type(obj).__name__ in ("Locator", "FrameLocator")
+
+
+class PageProbe:
+    """
+    包装 Page/Locator：异步方法调用经 RoundTripStats 计时计数，返回的 Locator 继续包装，
+    其余属性和同步方法原样透传，采集代码无需任何修改
+    """
+
+    def __init__(self, target, stats):
+        self._target = target
+        self._stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if _is_locator(attr):
+            return PageProbe(attr, self._stats)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if inspect.isawaitable(result):
+                return self._stats.timed(name, result)
+            if _is_locator(result):
+                return PageProbe(result, self._stats)
+            return result
+
+        return wrapper
+
+
+def _count_rows(task_dir):
+    csv_file_path = os.path.join(task_dir, os.getenv("HOT_WORDS_FILE_NAME"))
+    if not os.path.isfile(csv_file_path):
+        return 0
+    with open(csv_file_path, newline='', encoding='utf-8-sig') as csvfile:
+        return sum(1 for _ in csv.DictReader(csvfile))
+
+
+async def run_benchmark(har_path, logging, origin="US", category=0, nums=25, rounds=1, mode=None):
+    """
+    使用录制的 HAR 文件离线运行采集流程，统计行/秒、各阶段耗时和浏览器往返次数
+    :return: 每一轮的统计结果列表
+    """
+    os.environ.setdefault("HOT_WORDS_FILE_NAME", "hot_words.csv")
+    results = []
+    for round_index in range(rounds):
+        stats = RoundTripStats()
+        with tempfile.TemporaryDirectory(prefix="trends_bench_") as task_dir:
+            async with replay_page(har_path, logging) as (page, replay):
+                start = time.perf_counter()
+                await crawl_google_trends_page(PageProbe(page, stats), logging, origin=origin, category=category,
+                                               url="https://trends.google.com/trending", task_dir=task_dir,
+                                               to_download_image=False, nums=nums, mode=mode,
+                                               use_keyword_index=False)
+                elapsed = time.perf_counter() - start
+                rows = _count_rows(task_dir)
+                results.append({
+                    "round": round_index + 1,
+                    "rows": rows,
+                    "seconds": elapsed,
+                    "rows_per_second": rows / elapsed if elapsed else 0,
+                    "round_trips": stats.round_trips,
+                    "phases": stats.phases(),
+                    "calls": dict(stats.calls),
+                    "replay_misses": replay.misses,
+                })
+    return results
+
+
+def format_results(results):
+    lines = []
+    for result in results:
+        lines.append(f"第 {result['round']} 轮：{result['rows']} 行，耗时 {result['seconds']:.2f} 秒，"
+                     f"{result['rows_per_second']:.2f} 行/秒，浏览器往返 {result['round_trips']} 次，"
+                     f"回放未命中 {result['replay_misses']} 个请求")
+        measured = 0.0
+        for phase, (count, total) in sorted(result["phases"].items(), key=lambda item: -item[1][1]):
+            measured += total
+            lines.append(f"  {phase}：{count} 次，共 {total:.2f} 秒，平均 {total / count * 1000:.0f} 毫秒")
+        lines.append(f"  其他（限速等待、写入 CSV 等）：{max(result['seconds'] - measured, 0):.2f} 秒")
+        for name, (count, total, longest) in sorted(result["calls"].items()):
+            lines.append(f"    {name}：{count} 次，平均 {total / count * 1000:.0f} 毫秒，最长 {longest * 1000:.0f} 毫秒")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="趋势页采集离线基准测试（python -m core.benchmark）")
+    parser.add_argument("--record", action="store_true", help="先在线录制一次趋势页（需要代理）")
+    parser.add_argument("--har", default=None, help="HAR 文件路径，默认 replay/trends_<地区>_<分类>.har")
+    parser.add_argument("--geo", default="US", help="地区编码")
+    parser.add_argument("--category", type=int, default=0, help="分类编码")
+    parser.add_argument("--nums", type=int, default=25, help="采集的热词数量")
+    parser.add_argument("--rounds", type=int, default=3, help="回放轮数")
+    parser.add_argument("--mode", default=None, choices=["dom", "network"], help="采集模式，默认读取 CRAWL_MODE")
+    parser.add_argument("--no-throttle", action="store_true", help="关闭趋势页点击限速（RATE_LIMIT_TRENDS），测量纯采集耗时")
+    args = parser.parse_args()
+
+    if args.no_throttle:
+        os.environ["RATE_LIMIT_TRENDS"] = "off"
+    os.makedirs(os.path.join(root_dir, "logs"), exist_ok=True)
+    logger = get_logger(__name__, "benchmark.log")
+    har = args.har or default_har_path(args.geo, args.category)
+
+    async def main():
+        if args.record or not os.path.exists(har):
+            await record_trends_har(logger, har, origin=args.geo, category=args.category, nums=args.nums,
+                                    mode=args.mode)
+        results = await run_benchmark(har, logger, origin=args.geo, category=args.category, nums=args.nums,
+                                      rounds=args.rounds, mode=args.mode)
+        print(format_results(results))
+
+    asyncio.run(main())
@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import logging as _logging
+import os
+import threading
+
+from dotenv import load_dotenv
+from playwright.async_api import async_playwright
+
+from webui.utils.constant import root_dir
+from .browser_utils import launch_browser, new_context
+
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖，缺失时仅按任务数回收浏览器
+    psutil = None
+
+# 加载.env文件中的环境变量
+load_dotenv()
+
+__all__ = ["WarmBrowserManager", "get_browser_manager", "warm_browser_enabled"]
+
+
+def warm_browser_enabled():
+    return os.getenv("BROWSER_WARM", "false").lower() == "true"
+
+
+def _cookie_digest():
+    """当前 COOKIE_STRING 的摘要，用于判断保存的登录状态是否来自同一份 cookie"""
+    return hashlib.sha256(os.getenv("COOKIE_STRING", "").encode("utf-8")).hexdigest()
+
+
+class WarmBrowserManager:
+    """
+    常驻浏览器管理器：在多次定时任务之间保持同一个 Chromium 进程和一个基于 storage_state 的热上下文，
+    省去每次任务的 Playwright 启动、浏览器启动、cookie 解析和首屏冷启动开销
+    每次任务都会新建一个事件循环（asyncio.run），而 Playwright 对象只能在创建它的事件循环中使用，
+    因此浏览器运行在管理器自己的后台事件循环线程中，任务以协程函数的形式提交过去执行
+    满 N 次任务或内存增长超过阈值时，在空闲时回收并重启浏览器
+    登录状态与生成它的 COOKIE_STRING 摘要一起保存，cookie 变化（如在 web 界面中重新保存）后丢弃旧的登录状态，
+    并在空闲时按新的 cookie 重建热上下文
+    """
+
+    def __init__(self, logging=None, max_jobs=None, max_memory_growth_mb=None, storage_state_path=None):
+        self.logging = logging or _logging.getLogger(__name__)
+        self.max_jobs = max_jobs or int(os.getenv("BROWSER_RECYCLE_JOBS", "20"))
+        self.max_memory_growth_mb = max_memory_growth_mb or int(os.getenv("BROWSER_RECYCLE_MEMORY_MB", "1024"))
+        self.storage_state_path = storage_state_path or os.path.join(
+            root_dir, os.getenv("BROWSER_STORAGE_STATE", "storage_state.json"))
+        self.cookie_digest_path = self.storage_state_path + ".cookie"
+        self._loop = None
+        self._thread = None
+        self._lock = None
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        # 热上下文所用 cookie 的摘要
+        self._context_cookie = None
+        # 渲染用的浏览器：与原来的 chromium.launch(headless=True) 一致，不使用爬虫的代理和 User-Agent
+        self._render_browser = None
+        self._jobs = 0
+        self._active = 0
+        self._baseline_memory_mb = 0
+
+    # ---------- 后台事件循环 ----------
+    def _ensure_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="warm-browser", daemon=True)
+            self._thread.start()
+
+    async def _submit(self, coro):
+        """将协程提交到管理器的事件循环，并在调用方的事件循环中等待结果"""
+        self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return await asyncio.wrap_future(future)
+
+    # ---------- 浏览器生命周期（仅在管理器事件循环中调用） ----------
+    def _memory_mb(self):
+        """当前进程所有子进程（Playwright 驱动 + Chromium）的常驻内存总和"""
+        if psutil is None:
+            return 0
+        try:
+            children = psutil.Process().children(recursive=True)
+            return sum(child.memory_info().rss for child in children) / 1024 / 1024
+        except Exception:
+            return 0
+
+    # 日志记录器随每次任务传入，不保存在共享的管理器上（并行任务各自使用自己的日志）
+    async def _start(self, logging):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        self._browser = await launch_browser(self._playwright, logging)
+        self._context_cookie = _cookie_digest()
+        if self._saved_cookie() not in (None, self._context_cookie):
+            self._remove_storage_state(logging)
+        if os.path.exists(self.storage_state_path):
+            self._context = await new_context(self._browser, logging, storage_state=self.storage_state_path)
+            logging.info(f"已从 {self.storage_state_path} 恢复浏览器登录状态")
+        else:
+            self._context = await new_context(self._browser, logging)
+        self._jobs = 0
+        self._baseline_memory_mb = self._memory_mb()
+        logging.info("常驻浏览器已启动")
+
+    async def _close_crawl_browser(self, logging, save_state=True):
+        """关闭采集用的浏览器和热上下文（回收时使用，不影响渲染浏览器）"""
+        if self._browser is not None:
+            if save_state:
+                await self._save_storage_state(logging)
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logging.warning(f"关闭常驻浏览器失败: {e}")
+        self._browser = None
+        self._context = None
+
+    async def _close(self, logging):
+        await self._close_crawl_browser(logging)
+        if self._render_browser is not None:
+            try:
+                await self._render_browser.close()
+            except Exception as e:
+                logging.warning(f"关闭渲染浏览器失败: {e}")
+        self._render_browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            logging.info('浏览器和Playwright资源已关闭')
+        self._playwright = None
+
+    async def _save_storage_state(self, logging):
+        if self._context is None:
+            return
+        try:
+            await self._context.storage_state(path=self.storage_state_path)
+            with open(self.cookie_digest_path, "w", encoding="utf-8") as f:
+                f.write(self._context_cookie)
+        except Exception as e:
+            logging.warning(f"保存浏览器登录状态失败: {e}")
+
+    def _saved_cookie(self):
+        """保存登录状态时所用 cookie 的摘要，旧版本保存的登录状态没有摘要，视为与当前 cookie 一致"""
+        if not os.path.exists(self.cookie_digest_path):
+            return None
+        with open(self.cookie_digest_path, encoding="utf-8") as f:
+            return f.read().strip()
+
+    def _remove_storage_state(self, logging):
+        for path in (self.storage_state_path, self.cookie_digest_path):
+            if os.path.exists(path):
+                os.remove(path)
+        logging.info("COOKIE_STRING 已变化，丢弃之前保存的浏览器登录状态")
+
+    def _should_recycle(self, logging):
+        if self._jobs >= self.max_jobs:
+            logging.info(f"常驻浏览器已执行 {self._jobs} 次任务，进行回收")
+            return True
+        growth = self._memory_mb() - self._baseline_memory_mb
+        if growth >= self.max_memory_growth_mb:
+            logging.info(f"常驻浏览器内存增长 {growth:.0f}MB，进行回收")
+            return True
+        return False
+
+    async def _before_job(self, logging):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                await self._close_crawl_browser(logging)
+                await self._start(logging)
+            elif self._active == 0 and self._context_cookie != _cookie_digest():
+                # cookie 已变化，旧上下文的登录状态不再保存
+                await self._close_crawl_browser(logging, save_state=False)
+                await self._start(logging)
+            elif self._active == 0 and self._should_recycle(logging):
+                await self._close_crawl_browser(logging)
+                await self._start(logging)
+            self._active += 1
+
+    async def _after_job(self, logging):
+        self._active -= 1
+        self._jobs += 1
+        await self._save_storage_state(logging)
+
+    async def _run_page_job(self, job, logging):
+        await self._before_job(logging)
+        try:
+            page = await self._context.new_page()
+            try:
+                return await job(page)
+            finally:
+                if not page.is_closed():
+                    await page.close()
+        finally:
+            await self._after_job(logging)
+
+    async def _before_render_job(self, logging):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._render_browser is None or not self._render_browser.is_connected():
+                self._render_browser = await self._playwright.chromium.launch(headless=True)
+                logging.info("常驻渲染浏览器已启动")
+            self._active += 1
+
+    async def _run_browser_job(self, job, logging):
+        await self._before_render_job(logging)
+        try:
+            return await job(self._render_browser)
+        finally:
+            self._active -= 1
+
+    # ---------- 对外接口（可在任意事件循环中调用） ----------
+    async def run(self, job, logging=None):
+        """
+        借出热上下文中的一个页面执行任务，任务结束后关闭页面
+        :param job: 协程函数 job(page)
+        :param logging: 本次任务使用的日志记录器，默认使用管理器的日志记录器
+        :return: job 的返回值
+        """
+        return await self._submit(self._run_page_job(job, logging or self.logging))
+
+    async def run_with_browser(self, job, logging=None):
+        """
+        借出常驻的渲染浏览器执行任务（由任务自行创建上下文，如需录屏的渲染任务）
+        渲染浏览器单独启动，不使用代理和爬虫的 User-Agent，渲染本地文件时不依赖代理是否可用
+        :param job: 协程函数 job(browser)
+        :param logging: 本次任务使用的日志记录器，默认使用管理器的日志记录器
+        :return: job 的返回值
+        """
+        return await self._submit(self._run_browser_job(job, logging or self.logging))
+
+    def shutdown(self):
+        """关闭浏览器并停止后台事件循环"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(self.logging), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+        self._thread = None
+        self._lock = None
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_browser_manager(logging=None):
+    """获取全局唯一的常驻浏览器管理器"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = WarmBrowserManager(logging)
+    return _manager
@@ -0,0 +1,63 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from playwright.async_api import async_playwright
+
+from .browser_utils import launch_browser, new_context, close_browser
+
+# 加载.env文件中的环境变量
+load_dotenv()
+
+__all__ = ["BrowserContextPool"]
+
+
+class BrowserContextPool:
+    """
+    在同一个长驻 Chromium 进程中，维护数量有界的浏览器上下文
+    每个采集任务独占一个上下文（cookie、缓存相互隔离），用完即关闭，
+    并发数量由信号量控制，避免同时打开过多页面触发风控或耗尽内存
+    """
+
+    def __init__(self, logging, max_contexts=None):
+        self.logging = logging
+        self.max_contexts = max_contexts or int(os.getenv("CRAWL_MAX_CONTEXTS", "3"))
+        self._semaphore = asyncio.Semaphore(self.max_contexts)
+        self._playwright = None
+        self.browser = None
+
+    async def start(self):
+        if self.browser is None:
+            self._playwright = await async_playwright().start()
+            self.browser = await launch_browser(self._playwright, self.logging)
+            self.logging.info(f"浏览器池已启动，最大并发上下文数：{self.max_contexts}")
+        return self
+
+    async def close(self):
+        if self.browser is not None:
+            await close_browser(self._playwright, self.browser, self.logging)
+            self.browser = None
+            self._playwright = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @asynccontextmanager
+    async def page(self, **context_kwargs):
+        """
+        借出一个页面，退出时关闭其所属上下文并归还并发名额
+        :param context_kwargs: 透传给 new_context 的参数
+        """
+        async with self._semaphore:
+            if self.browser is None:
+                await self.start()
+            context = await new_context(self.browser, self.logging, **context_kwargs)
+            page = await context.new_page()
+            try:
+                yield page
+            finally:
+                await context.close()
@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 # 加载.env文件中的环境变量
 load_dotenv()
 
-__all__ = ['parse_cookie_string', 'init_browser', 'close_browser']
+__all__ = ['parse_cookie_string', 'init_browser', 'close_browser', 'launch_browser', 'new_context']
 
 def parse_cookie_string(cookie_str: str) -> list:
     """解析从浏览器复制的cookie字符串，返回Playwright所需的cookie列表"""
@@ -17,10 +17,14 @@ def parse_cookie_string(cookie_str: str) -> list:
             cookies.append({"name": key, "value": value, "url": "https://trends.google.com/"})
     return cookies
 
-async def init_browser(logging):
-    p = await async_playwright().__aenter__()
+async def launch_browser(p, logging):
+    """
+    启动 Chromium 浏览器（代理、无头模式等配置读取自环境变量）
+    :param p: 已启动的 Playwright 实例
+    :param logging: 日志记录器对象
+    :return: Browser 对象
+    """
     headless = os.getenv('HEADLESS', 'True').lower() == 'true'
-    cookie_str = os.getenv('COOKIE_STRING')
 
     # 获取代理配置
     proxy_server = os.getenv("PROXY_URL", "127.0.0.1:7890")
@@ -35,7 +39,18 @@ async def init_browser(logging):
             f'--user-agent={os.getenv("USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")}',
         ]
     )
+    logging.info(f'浏览器已启动，无头模式：{headless}')
+    return browser
 
+async def new_context(browser, logging, **kwargs):
+    """
+    在已有浏览器中创建一个新的上下文，并设置请求头与 cookies
+    :param browser: Browser 对象
+    :param logging: 日志记录器对象
+    :param kwargs: 透传给 browser.new_context 的其他参数（传入 storage_state 时不再设置 COOKIE_STRING）
+    :return: BrowserContext 对象
+    """
+    cookie_str = os.getenv('COOKIE_STRING')
     context = await browser.new_context(
         user_agent=os.getenv("USER_AGENT"),
         extra_http_headers={
@@ -43,7 +58,8 @@ async def init_browser(logging):
             "Referer": os.getenv("REFERER", "https://www.google.com/"),
             "Accept-Encoding": "gzip, deflate, br",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        }
+        },
+        **kwargs
     )
 
     # 解析并设置cookies
@@ -53,12 +69,21 @@ async def init_browser(logging):
     #     cookie_str = settings.get("COOKIE_STRING")
     # else:
 
-    if cookie_str:
+    if kwargs.get("storage_state"):
+        # 已从 storage_state 恢复 cookies，无需重复解析
+        pass
+    elif cookie_str:
         cookies = parse_cookie_string(cookie_str)
         await context.add_cookies(cookies)
         logging.info('Cookies 设置成功')
     else:
         logging.warning('未找到环境变量中的 COOKIE_STRING')
+    return context
+
+async def init_browser(logging):
+    p = await async_playwright().__aenter__()
+    browser = await launch_browser(p, logging)
+    context = await new_context(browser, logging)
 
     # 打开页面
     page = await context.new_page()
@@ -67,4 +92,4 @@ async def init_browser(logging):
 async def close_browser(p, browser, logging):
     await browser.close()
     await p.stop()
-    logging.info('浏览器和Playwright资源已关闭')
\ No newline at end of file
+    logging.info('浏览器和Playwright资源已关闭')
@@ -1,13 +1,68 @@
 import asyncio
-import csv
+import re
+import time
 from dotenv import load_dotenv
 import os
 from .image_utils import ImageUtils
+from .keyword_index import get_keyword_index, format_trend_status, reuse_images_enabled, track_download
+from .result_sink import get_result_sink
+from .route_filter import RouteFilter
+from .trends_parser import parse_trends_response
+from .rate_limiter import get_rate_limiter
 
 # 加载.env文件中的环境变量
 load_dotenv()
 current_path = os.path.dirname(os.path.abspath(__file__))
-__all__ = ['crawl_google_trends_page']
+__all__ = ['crawl_google_trends_page', 'extract_rows_bulk', 'extract_related_news', 'TrendsResponseCollector']
+
+# 热词表格的行选择器
+ROWS_SELECTOR = 'tbody:nth-child(3) > tr'
+# 每一行中各字段的选择器（相对于行）
+ROW_FIELD_SELECTORS = {
+    'hot_word': 'td.enOdEe-wZVHld-aOtOmf.jvkLtd > div.mZ3RIc',
+    'search_volume': 'td.enOdEe-wZVHld-aOtOmf.dQOTjf > div > div.lqv0Cb',
+    'search_growth_rate': 'td.enOdEe-wZVHld-aOtOmf.dQOTjf > div > div.wqrjjc > div',
+    'search_active_time': 'td.enOdEe-wZVHld-aOtOmf.WirRge > div.vdw3Ld',
+}
+# 点击热词后右侧面板中的关联新闻标题与图片
+NEWS_TITLE_SELECTOR = 'div.jDtQ5 > div:nth-child(n) > a > div.MEJ15 > div.QbLC8c'
+NEWS_IMAGE_SELECTOR = 'div.jDtQ5 > div:nth-child(n) > a > div.yYagic > img'
+
+# 一次 evaluate 取回指定行的全部字段，避免逐行逐字段的 CDP 往返
+_BULK_ROWS_JS = """
+([rowSelector, fieldSelectors, indices]) => {
+    const rows = Array.from(document.querySelectorAll(rowSelector));
+    const records = indices.filter(i => i < rows.length).map(i => {
+        const record = {index: i};
+        for (const [name, selector] of Object.entries(fieldSelectors)) {
+            const el = rows[i].querySelector(selector);
+            record[name] = el ? el.textContent.trim() : null;
+        }
+        return record;
+    });
+    return {total: rows.length, records: records};
+}
+"""
+
+# 关联新闻面板已填充，且内容与点击前不同（避免读到上一个热词的新闻）
+_NEWS_READY_JS = """
+([titleSelector, previous]) => {
+    const titles = Array.from(document.querySelectorAll(titleSelector)).map(el => el.textContent.trim()).filter(t => t);
+    return titles.length > 0 && titles.join('\\n') !== previous;
+}
+"""
+
+_BULK_NEWS_JS = """
+([titleSelector, imageSelector]) => ({
+    titles: Array.from(document.querySelectorAll(titleSelector)).map(el => el.textContent.trim()),
+    images: Array.from(document.querySelectorAll(imageSelector)).map(el => el.getAttribute('src')).filter(src => src),
+})
+"""
+
+
+def _exact_text(text):
+    """匹配完整文本（忽略首尾空白和大小写）的正则，用于 locator 的 has_text"""
+    return re.compile(rf"^\s*{re.escape(text.strip())}\s*$", re.I)
 
 
 async def query_selector_with_retry(page, logging, selector, max_retries=3, delay=2):
@@ -38,10 +93,178 @@ async def query_selector_with_retry(page, logging, selector, max_retries=3, dela
     return []
 
 
+def _is_complete_row(record):
+    return record is not None and all(record.get(name) for name in ROW_FIELD_SELECTORS)
+
+
+async def extract_rows_bulk(page, logging, nums=25, max_retries=3, delay=2):
+    """
+    通过一次 page.evaluate 批量提取前 nums 行的热词、搜索量、增长率、活跃时间
+    字段不完整的行会在下一次尝试中作为一个批次统一重试
+    :param page: Playwright 页面对象
+    :param logging: 日志记录器对象
+    :param nums: 需要提取的行数
+    :param max_retries: 最大尝试次数
+    :param delay: 每次重试间隔时间（秒）
+    :return: 按行号排序的记录列表，每条记录包含 index 与各字段文本（缺失字段为空字符串）
+    """
+    records = {}
+    pending = list(range(nums))
+    for attempt in range(max_retries):
+        try:
+            result = await page.evaluate(_BULK_ROWS_JS, [ROWS_SELECTOR, ROW_FIELD_SELECTORS, pending])
+        except Exception as e:
+            logging.error(f"批量提取热词行出错: {e}")
+            result = {"total": 0, "records": []}
+
+        for record in result["records"]:
+            # 仅用本次取到的非空字段覆盖，避免重试时把已有字段覆盖为空
+            merged = records.get(record["index"], {})
+            merged.update({k: v for k, v in record.items() if v})
+            records[record["index"]] = merged
+        pending = [i for i in pending if i < result["total"] and not _is_complete_row(records.get(i))]
+
+        if result["total"] > 0 and not pending:
+            logging.debug(f"第 {attempt + 1} 次尝试批量提取了 {len(records)} 行")
+            break
+        if attempt < max_retries - 1:
+            logging.warning(f"第 {attempt + 1} 次批量提取，共 {result['total']} 行，{len(pending)} 行字段不完整，"
+                            f"等待 {delay} 秒后重试...")
+            await asyncio.sleep(delay)
+
+    if not records:
+        logging.error(f"经过 {max_retries} 次尝试仍未找到热词行：{ROWS_SELECTOR}")
+    elif pending:
+        logging.error(f"经过 {max_retries} 次尝试仍有 {len(pending)} 行字段不完整：{pending}")
+
+    rows = []
+    for index in sorted(records):
+        record = records[index]
+        if not record.get('hot_word'):
+            logging.warning(f"第 {index + 1} 行未找到关键词，跳过")
+            continue
+        rows.append({"index": index, **{name: record.get(name) or '' for name in ROW_FIELD_SELECTORS}})
+    return rows
+
+
+async def extract_related_news(page, logging, max_retries=3, delay=2):
+    """
+    通过一次 page.evaluate 批量提取当前面板中的关联新闻标题和图片地址
+    :return: (标题列表, 图片地址列表)
+    """
+    for attempt in range(max_retries):
+        try:
+            news = await page.evaluate(_BULK_NEWS_JS, [NEWS_TITLE_SELECTOR, NEWS_IMAGE_SELECTOR])
+            if news["titles"]:
+                return news["titles"], news["images"]
+            logging.warning(f"第 {attempt + 1} 次尝试未找到关联新闻")
+        except Exception as e:
+            logging.error(f"批量提取关联新闻出错: {e}")
+
+        if attempt < max_retries - 1:
+            logging.info(f"等待 {delay} 秒后重试...")
+            await asyncio.sleep(delay)
+
+    logging.error(f"经过 {max_retries} 次尝试仍未找到关联新闻")
+    return [], []
+
+
+async def wait_for_related_news(page, logging, previous_titles=None, collector=None, timeout=None):
+    """
+    点击热词后等待关联新闻就绪，替代固定的 sleep
+    就绪条件依次为：捕获到新闻接口响应（network 模式）/ 新闻面板已刷新 / 网络空闲
+    :param previous_titles: 点击前面板中的新闻标题，用于判断面板是否已刷新
+    :param collector: TrendsResponseCollector 对象（network 模式）
+    :param timeout: 最长等待时间（秒），默认读取环境变量 CRAWL_WAIT_TIMEOUT
+    :return: (捕获到的新闻列表, 是否就绪, 实际等待秒数)
+    """
+    timeout = float(timeout if timeout is not None else os.getenv("CRAWL_WAIT_TIMEOUT", "10"))
+    start = time.monotonic()
+    news = []
+    ready = False
+
+    if collector:
+        news = await collector.wait_for_news(timeout)
+        ready = bool(news)
+    if not ready:
+        remaining = max(timeout - (time.monotonic() - start), 0.1)
+        try:
+            await page.wait_for_function(_NEWS_READY_JS, arg=[NEWS_TITLE_SELECTOR, '\n'.join(previous_titles or [])],
+                                         timeout=remaining * 1000)
+            ready = True
+        except Exception as e:
+            logging.debug(f"等待关联新闻面板刷新超时: {e}")
+            try:
+                await page.wait_for_load_state("networkidle", timeout=remaining * 1000)
+            except Exception as e:
+                logging.debug(f"等待网络空闲超时: {e}")
+
+    return news, ready, time.monotonic() - start
+
+
+class TrendsResponseCollector:
+    """
+    监听页面响应，捕获趋势页自身发起的 batchexecute 请求，
+    直接从接口数据中解析热词、搜索量、关联新闻和图片地址，不再依赖易变的 CSS 选择器
+    """
+
+    def __init__(self, logging):
+        self.logging = logging
+        self.trends = []
+        self.news = []
+        self._trends_event = asyncio.Event()
+        self._news_event = asyncio.Event()
+
+    def attach(self, page):
+        page.on("response", self._on_response)
+
+    def detach(self, page):
+        page.remove_listener("response", self._on_response)
+
+    async def _on_response(self, response):
+        if "batchexecute" not in response.url:
+            return
+        try:
+            text = await response.text()
+        except Exception as e:
+            self.logging.debug(f"读取接口响应失败: {response.url}, {e}")
+            return
+        parsed = parse_trends_response(text)
+        if parsed["trends"]:
+            self.trends = parsed["trends"]
+            self._trends_event.set()
+            self.logging.debug(f"捕获热词接口数据 {len(self.trends)} 条")
+        if parsed["news"]:
+            self.news = parsed["news"]
+            self._news_event.set()
+            self.logging.debug(f"捕获关联新闻接口数据 {len(self.news)} 条")
+
+    async def wait_for_trends(self, timeout=15):
+        try:
+            await asyncio.wait_for(self._trends_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.logging.warning(f"{timeout} 秒内未捕获到热词接口数据")
+        return self.trends
+
+    def reset_news(self):
+        """点击下一个热词前清空上一次捕获的新闻"""
+        self.news = []
+        self._news_event.clear()
+
+    async def wait_for_news(self, timeout=10):
+        try:
+            await asyncio.wait_for(self._news_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.logging.warning(f"{timeout} 秒内未捕获到关联新闻接口数据")
+        return self.news
+
+
 async def crawl_google_trends_page(page, logging, origin="", category=0, url="", task_dir=None,
-                                   to_download_image=False, nums=25):
+                                   to_download_image=False, nums=25, mode=None, use_keyword_index=True):
     """
     爬取 Google Trends 页面内容
+    :param mode: 采集模式，dom 为解析页面元素，network 为解析页面自身的接口响应，默认读取环境变量 CRAWL_MODE
+    :param use_keyword_index: 是否登记到热词索引，基准测试、录制等写入临时文件夹的采集传入 False
     :param category:
     :param origin:
     :param to_download_image:
@@ -50,7 +273,6 @@ async def crawl_google_trends_page(page, logging, origin="", category=0, url="",
     :param logging: 日志记录器对象
     :param task_dir: 任务文件夹路径
     """
-    global hot_words
     if url != "":
         url = url
     if origin != "":
@@ -58,125 +280,127 @@ async def crawl_google_trends_page(page, logging, origin="", category=0, url="",
     if category != 0:
         url += f"&category={category}"
 
-    # 打开页面
-    if not page.is_closed():
-        await page.goto(url)
-        logging.info(f'页面加载完成：{url}')
-    else:
+    mode = (mode or os.getenv("CRAWL_MODE", "dom")).lower()
+    collector = None
+    if mode == "network":
+        # 需在页面导航前注册监听，才能捕获到首屏的热词接口
+        collector = TrendsResponseCollector(logging)
+        collector.attach(page)
+
+    if page.is_closed():
         logging.error("页面已关闭，无法导航")
+        if collector:
+            collector.detach(page)
         return
-    await query_selector_with_retry(page, logging, 'div.VfPpkd-dgl2Hf-ppHlrf-sM5MNb > div', max_retries=3, delay=2)
-
-    # 第一次加载图片
+    # 拦截字体、广告统计等无用请求，不下载图片时一并拦截图片
+    route_filter = await RouteFilter.for_crawl(logging, block_images=not to_download_image).install(page)
+    image_util = ImageUtils(os.getenv("PROXY_URL"))
+    image_tasks = []
+    # 任意一行出错时也要等待已提交的图片下载、关闭下载会话并卸载请求拦截
     try:
-        elements = await query_selector_with_retry(page, logging,
-                                                   'tbody:nth-child(3) > tr:nth-child(n)')
-        elements_temp = elements[:nums]  # ✅ 在 await 后进行切片
-
-    except Exception as e:
-        logging.error(f'未找到 div 元素: {e}')
-        elements_temp = []  # ✅ 添加默认空列表防止后续引用错误
-
-    for i, div in enumerate(elements_temp):
-        hot_words_elements = await query_selector_with_retry(div, logging,
-                                                             'td.enOdEe-wZVHld-aOtOmf.jvkLtd > div.mZ3RIc',
-                                                             max_retries=3, delay=2)
-
-        search_volume_element = await query_selector_with_retry(div, logging,
-                                                                'td.enOdEe-wZVHld-aOtOmf.dQOTjf > div > div.lqv0Cb',
-                                                                max_retries=3, delay=2)
-
-        search_growth_rate_element = await query_selector_with_retry(div, logging,
-                                                                     'td.enOdEe-wZVHld-aOtOmf.dQOTjf > div > div.wqrjjc > div',
-                                                                     max_retries=3, delay=2)
-
-        search_active_time_element = await query_selector_with_retry(div, logging,
-                                                                     'td.enOdEe-wZVHld-aOtOmf.WirRge > div.vdw3Ld',
-                                                                     max_retries=3, delay=2)
-        if hot_words_elements:
-            hot_word_element = hot_words_elements[0]  # 取第一个元素
-            search_volume = await search_volume_element[0].text_content()
-            search_growth_rate = await search_growth_rate_element[0].text_content()
-            search_active_time = await  search_active_time_element[0].text_content()
-            text_content = await hot_word_element.text_content()
-            text_content = f"{i + 1}-{text_content}"
-        else:
-            logging.warning("未找到关键词元素，使用默认名称代替")
-            continue
-        logging.info(f'div {i + 1} 的文本内容: {text_content}')
+        # 打开页面
+        await page.goto(url)
+        logging.info(f'页面加载完成：{url}')
+        await query_selector_with_retry(page, logging, 'div.VfPpkd-dgl2Hf-ppHlrf-sM5MNb > div', max_retries=3, delay=2)
 
-        try:
-            await hot_word_element.click()
-            await asyncio.sleep(5)
-            logging.debug(f'点击了 div {i + 1}')
-        except Exception as e:
-            logging.error(f'点击 div {i + 1} 时出错: {e}')
-        # 查看关联新闻
-        new_titles_selector = 'div.jDtQ5 > div:nth-child(n) > a > div.MEJ15 > div.QbLC8c'
-        new_titles = await query_selector_with_retry(page, logging, new_titles_selector)
-        title_new = []
-        for index, title in enumerate(new_titles):
-            title_text = await title.text_content()
-            logging.info(f"关键词{text_content}：第{index + 1}个标题：{title_text}")
-            title_new.append(f"标题{index + 1}:{title_text}")
-
-        if to_download_image:
-            # 获取指定路径下的图片的 src 地址
-            img_selector = 'div.jDtQ5 > div:nth-child(n) > a > div.yYagic > img'
-            img_src_list = await query_selector_with_retry(page, logging, img_selector)
-            logging.info(f"关键词{text_content}：图片数量：{len(img_src_list)}")
-            if len(img_src_list) < 3:
-                logging.warning(f"关键词{text_content}：图片数量不足3张，请注意")
-
-            for index, img in enumerate(img_src_list):
-                if img:
-                    src = await img.get_attribute('src')
-                    logging.debug(f'图片 {i + 1} 的 src 地址: {src}')
-                    image_util = ImageUtils(os.getenv("PROXY_URL"))
-                    await image_util.download_and_resize_image(
-                        logging,
-                        img_url=src,
-                        task_dir=os.path.join(task_dir, text_content, "new_images"),  # 保存在任务文件夹中
-                        image_name=f"{text_content}_{index}.jpg"
-                    )
+        rows = []
+        if collector:
+            trends = await collector.wait_for_trends()
+            rows = [{"index": index, **trend} for index, trend in enumerate(trends[:nums])]
+            if not rows:
+                logging.warning("未从接口中解析到热词，回退为页面元素解析")
+        if not rows:
+            # 一次性取回所有行的文本字段
+            rows = await extract_rows_bulk(page, logging, nums=nums)
+        row_locator = page.locator(ROWS_SELECTOR)
+        previous_titles = []
+        keyword_index = get_keyword_index(logging) if use_keyword_index else None
+
+        # 整个任务只打开一次结果文件，异常退出时也会写入已采集的数据
+        with get_result_sink(task_dir, logging) as sink:
+            for row in rows:
+                i = row["index"]
+                search_volume = row["search_volume"]
+                search_growth_rate = row["search_growth_rate"]
+                search_active_time = row["search_active_time"]
+                text_content = f"{i + 1}-{row['hot_word']}"
+                logging.info(f'div {i + 1} 的文本内容: {text_content}')
+
+                if collector:
+                    collector.reset_news()
+                # 点击频率由全局令牌桶控制（RATE_LIMIT_TRENDS），多地区并行采集时共享同一限速
+                throttled = await get_rate_limiter("trends").acquire_async()
+                if throttled:
+                    logging.debug(f"限速等待 {throttled:.2f} 秒")
+                try:
+                    if "news_tokens" in row:
+                        # 接口数据的顺序不一定与表格一致，按关键词文本精确定位（has_text 为子串匹配，
+                        # “harper” 会匹配到 “bryce harper” 所在的行）
+                        hot_word_locator = page.locator(ROW_FIELD_SELECTORS['hot_word'],
+                                                        has_text=_exact_text(row['hot_word'])).first
+                    else:
+                        hot_word_locator = row_locator.nth(i).locator(ROW_FIELD_SELECTORS['hot_word']).first
+                    await hot_word_locator.click()
+                    logging.debug(f'点击了 div {i + 1}')
+                except Exception as e:
+                    logging.error(f'点击 div {i + 1} 时出错: {e}')
+                # 查看关联新闻
+                news, ready, waited = await wait_for_related_news(page, logging, previous_titles, collector)
+                logging.info(f"关键词{text_content}：等待关联新闻耗时 {waited:.2f} 秒，{'已就绪' if ready else '等待超时'}")
+                if news:
+                    new_titles = [item["title"] for item in news]
+                    img_src_list = [item["image"] for item in news if item["image"]]
                 else:
-                    logging.error(f'未找到图片元素在 div {i + 1} 中')
-        else:
-            os.makedirs(os.path.join(task_dir, text_content), exist_ok=True)
-            logging.info(f"保存关键词：{text_content}成功")
-
-        # 将 text_content 写入 CSV 文件
-        csv_file_path = os.path.join(task_dir, os.getenv("HOT_WORDS_FILE_NAME"))
-        file_exists = os.path.isfile(csv_file_path)
-        with open(csv_file_path, 'a', newline='', encoding='utf-8-sig') as csvfile:
-            fieldnames = ['hot_word',
-                          'search_volume',
-                          'search_growth_rate',
-                          "search_active_time",
-                          "relation_news",
-                          "search_history",
-                          "highlights",
-                          "chinese",
-                          "output",
-                          "result"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(
-                {'hot_word': text_content,
-                 'search_volume': search_volume,
-                 'search_growth_rate': str(search_growth_rate).replace(',', ''),
-                 "search_active_time": search_active_time,
-                 "relation_news": '---'.join(title_new),
-                 "search_history": '',
-                 "chinese": '',
-                 "output": '',
-                 "highlights": "",
-                 "result":""
-                 })
-            logging.info(
-                f"关键词 {text_content} ,搜索量：{search_volume}，搜索增长率：{str(search_growth_rate).replace(',', '')}，搜索活跃时间：{search_active_time}")
-            logging.info(f"关键词 {text_content} 已存储至 CSV 文件")
-
-            await asyncio.sleep(5)
-    logging.info(f"地区编码：{origin}，分类编码：{category}，采集任务已完成，共采集了{len(hot_words_elements)}个关键词")
+                    new_titles, img_src_list = await extract_related_news(page, logging)
+                previous_titles = new_titles
+                title_new = []
+                for index, title_text in enumerate(new_titles):
+                    logging.info(f"关键词{text_content}：第{index + 1}个标题：{title_text}")
+                    title_new.append(f"标题{index + 1}:{title_text}")
+
+                # 先创建热词文件夹，图片在后台下载时 CSV 也能正常写入任务文件夹
+                hot_word_dir = os.path.join(task_dir, text_content)
+                os.makedirs(hot_word_dir, exist_ok=True)
+                if keyword_index:
+                    trend = keyword_index.observe(row['hot_word'], origin, hot_word_dir)
+                    logging.info(f"关键词{text_content}：{format_trend_status(trend)}")
+                images_dir = os.path.join(hot_word_dir, "new_images")
+                if to_download_image and keyword_index and reuse_images_enabled() and \
+                        keyword_index.reuse_artifact(hot_word_dir, "images", images_dir):
+                    logging.info(f"关键词{text_content}：复用之前批次下载的图片，跳过下载")
+                elif to_download_image:
+                    # 获取指定路径下的图片的 src 地址
+                    logging.info(f"关键词{text_content}：图片数量：{len(img_src_list)}")
+                    if len(img_src_list) < 3:
+                        logging.warning(f"关键词{text_content}：图片数量不足3张，请注意")
+
+                    # 后台并发下载该热词的全部图片，不阻塞下一行的采集，下载完成后再登记到热词索引
+                    image_tasks.append(asyncio.create_task(track_download(
+                        keyword_index, hot_word_dir, "images", images_dir, image_util.download_many(logging, [
+                            (src, images_dir, f"{text_content}_{index}.jpg")  # 保存在任务文件夹中
+                            for index, src in enumerate(img_src_list)
+                        ]))))
+                else:
+                    logging.info(f"保存关键词：{text_content}成功")
+
+                # 写入 CSV 文件（按批写入，任务结束时统一落盘）
+                sink.write({'hot_word': text_content,
+                            'search_volume': search_volume,
+                            'search_growth_rate': str(search_growth_rate).replace(',', ''),
+                            "search_active_time": search_active_time,
+                            "relation_news": '---'.join(title_new)})
+                logging.info(
+                    f"关键词 {text_content} ,搜索量：{search_volume}，搜索增长率：{str(search_growth_rate).replace(',', '')}，搜索活跃时间：{search_active_time}")
+                logging.info(f"关键词 {text_content} 已加入 CSV 写入队列")
+    finally:
+        if image_tasks:
+            results = await asyncio.gather(*image_tasks, return_exceptions=True)
+            results = [result for result in results if not isinstance(result, BaseException)]
+            logging.info(f"图片下载完成，成功 {sum(sum(result) for result in results)} 张，"
+                         f"共 {sum(len(result) for result in results)} 张")
+        await image_util.close()
+        if collector:
+            collector.detach(page)
+        await route_filter.uninstall(page)
+        route_filter.report(f"地区编码：{origin}，分类编码：{category}，")
+    logging.info(f"地区编码：{origin}，分类编码：{category}，采集任务已完成，共采集了{len(rows)}个关键词")
@@ -1,6 +1,8 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
 from dotenv import load_dotenv
 import aiohttp
 from aiohttp_socks import ProxyConnector
@@ -12,45 +14,159 @@ load_dotenv()
 # # 推导项目根目录（假设项目根目录是当前脚本的祖父目录）
 # project_root = os.path.dirname(os.path.dirname(current_file_path))
 
-__all__ = ["ImageUtils"]
+__all__ = ["ImageUtils", "normalize_image"]
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+    'Referer': 'https://trends.google.com/'
+}
+
+# 支持的输出格式及对应的文件扩展名
+IMAGE_FORMATS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+_executor = None
+
+
+def _get_executor():
+    """图片解码/缩放/编码的 CPU 池，IMAGE_POOL=process 时使用进程池，默认线程池（PIL 在编解码时会释放 GIL）"""
+    global _executor
+    if _executor is None:
+        workers = int(os.getenv("IMAGE_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+        if os.getenv("IMAGE_POOL", "thread").lower() == "process":
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+    return _executor
+
+
+def normalize_image(image_bytes, max_width=1280, max_height=1280, quality=85, image_format="JPEG"):
+    """
+    解码图片，按最大宽高等比缩小，并重新编码为 JPEG/WebP
+    纯函数，便于放到线程池或进程池中执行
+    :param image_bytes: 原始图片字节
+    :param max_width: 最大宽度，0 表示不限制
+    :param max_height: 最大高度，0 表示不限制
+    :param quality: 编码质量（1-100）
+    :param image_format: 输出格式，JPEG 或 WEBP
+    :return: 处理后的图片字节
+    """
+    image_format = image_format.upper()
+    with Image.open(BytesIO(image_bytes)) as image:
+        size = (max_width or image.width, max_height or image.height)
+        # JPEG 可直接按缩小后的尺寸解码，省去大图的完整解码
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if image_format == "JPEG" and has_alpha:
+            # JPEG 不支持透明通道，铺白底
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        elif image_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        image.thumbnail(size, Image.LANCZOS)
+        output = BytesIO()
+        if image_format == "WEBP":
+            image.save(output, format="WEBP", quality=quality, method=4)
+        else:
+            image.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+def _normalize_and_save(image_bytes, save_path, max_width, max_height, quality, image_format):
+    data = normalize_image(image_bytes, max_width, max_height, quality, image_format)
+    with open(save_path, "wb") as f:
+        f.write(data)
+    return len(data)
 
 
 class ImageUtils:
-    def __init__(self, proxy_url=None):
+    """
+    图片下载工具：同一个实例内复用一个带 keep-alive 的 aiohttp 会话，
+    并通过信号量限制同时进行的下载数量
+    下载后按配置的最大宽高、质量和格式（JPEG/WebP）重新编码，编解码放在 CPU 池中执行，不阻塞事件循环
+    用完后调用 close()，或使用 async with ImageUtils(...) as image_util
+    """
+
+    def __init__(self, proxy_url=None, max_concurrency=None):
         self.proxy_url = proxy_url
+        self.max_concurrency = max_concurrency or int(os.getenv("IMAGE_DOWNLOAD_CONCURRENCY", "8"))
+        self.max_width = int(os.getenv("IMAGE_MAX_WIDTH", "1280"))
+        self.max_height = int(os.getenv("IMAGE_MAX_HEIGHT", "1280"))
+        self.quality = int(os.getenv("IMAGE_QUALITY", "85"))
+        self.image_format = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+        if self.image_format not in IMAGE_FORMATS:
+            self.image_format = "JPEG"
+        self._session = None
+        self._semaphore = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector_args = {"limit": self.max_concurrency, "keepalive_timeout": 30}
+            if self.proxy_url:
+                connector = ProxyConnector.from_url(self.proxy_url, **connector_args)
+            else:
+                connector = aiohttp.TCPConnector(**connector_args)
+            self._session = aiohttp.ClientSession(connector=connector, headers=HEADERS,
+                                                  timeout=aiohttp.ClientTimeout(total=10))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
     async def download_and_resize_image(self, logging, img_url, task_dir, image_name=None):
-        if self.proxy_url:
-            connector = ProxyConnector.from_url(self.proxy_url)
-        else:
-            connector = None
+        session = self._get_session()
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
-                'Referer': 'https://trends.google.com/'
-            }
-            async with aiohttp.ClientSession(connector=connector) as session:
-                async with session.get(img_url, headers=headers, timeout=10) as response:
-                    if response.status == 200:
-                        image_data = BytesIO(await response.read())
-                        image = Image.open(image_data)
-
-                        if image_name is None:
-                            image_name = img_url.split('/')[-1]
-                        image_dir = task_dir
-                        if image_dir and not os.path.exists(image_dir):
-                            os.makedirs(image_dir)
-                        save_path = os.path.join(image_dir, f"{image_name}")
-                        image.save(save_path)
-                        logging.info(f"图片下载成功: {save_path}")
-                        return True
-                    else:
+            async with self._semaphore:
+                async with session.get(img_url) as response:
+                    if response.status != 200:
                         logging.error(f'下载图片失败，状态码: {response.status}')
                         return False
+                    image_data = await response.read()
+
+            if image_name is None:
+                image_name = img_url.split('/')[-1]
+            # 扩展名与输出格式保持一致
+            image_name = os.path.splitext(image_name)[0] + IMAGE_FORMATS[self.image_format]
+            image_dir = task_dir
+            if image_dir and not os.path.exists(image_dir):
+                os.makedirs(image_dir, exist_ok=True)
+            save_path = os.path.join(image_dir, f"{image_name}")
+
+            # 解码、缩放、编码放到 CPU 池中执行，且不占用下载并发名额
+            saved_size = await asyncio.get_running_loop().run_in_executor(
+                _get_executor(), _normalize_and_save, image_data, save_path,
+                self.max_width, self.max_height, self.quality, self.image_format)
+            logging.info(f"图片下载成功: {save_path}，原始 {len(image_data) // 1024}KB，处理后 {saved_size // 1024}KB")
+            return True
         except Exception as e:
             logging.error(f'下载图片时出错: {e}')
             return False
 
+    async def download_many(self, logging, images):
+        """
+        并发下载一批图片（并发数受 max_concurrency 限制）
+        :param images: [(img_url, task_dir, image_name), ...]
+        :return: 与输入顺序一致的下载结果列表（True/False）
+        """
+        return await asyncio.gather(*[
+            self.download_and_resize_image(logging, img_url=img_url, task_dir=task_dir, image_name=image_name)
+            for img_url, task_dir, image_name in images
+        ])
+
 #
 # if __name__ == "__main__":
 #     import asyncio  # 导入 asyncio 模块
@@ -0,0 +1,275 @@
+import csv
+import json
+import logging as _logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from dotenv import load_dotenv
+
+from webui.utils.constant import root_dir
+
+# 加载.env文件中的环境变量
+load_dotenv()
+
+__all__ = ["normalize_keyword", "KeywordIndex", "get_keyword_index", "format_trend_status", "reuse_images_enabled",
+           "track_download", "RESEARCH_FIELDS"]
+
+# 深度研究写入热词 CSV 的字段，复用上一次的研究结果时一并带过来
+RESEARCH_FIELDS = ("search_history", "highlights", "chinese", "output")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trends (
+    keyword_key TEXT NOT NULL,
+    geo TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    seen_count INTEGER NOT NULL DEFAULT 1,
+    last_dir TEXT,
+    artifacts TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (keyword_key, geo)
+);
+CREATE TABLE IF NOT EXISTS sightings (
+    hot_word_dir TEXT PRIMARY KEY,
+    keyword_key TEXT NOT NULL,
+    geo TEXT NOT NULL,
+    status TEXT NOT NULL,
+    previous_dir TEXT,
+    seen_at REAL NOT NULL
+);
+"""
+
+
+def normalize_keyword(keyword):
+    """统一全半角、大小写和空白，使同一热词在不同批次中得到相同的键"""
+    keyword = unicodedata.normalize("NFKC", keyword or "")
+    return re.sub(r"\s+", " ", keyword).strip().lower()
+
+
+def format_trend_status(trend):
+    """将 observe 的结果格式化为日志文本"""
+    if trend["status"] == "new":
+        return "新热词"
+    first_seen = time.strftime("%Y-%m-%d %H:%M", time.localtime(trend["first_seen"]))
+    return f"回访热词，首次出现于 {first_seen}，第 {trend['seen_count']} 次出现"
+
+
+def reuse_images_enabled():
+    return os.getenv("KEYWORD_REUSE_IMAGES", "false").lower() == "true"
+
+
+def _count_files(path):
+    if os.path.isfile(path):
+        return 1
+    return sum(len(files) for _, _, files in os.walk(path)) if os.path.isdir(path) else 0
+
+
+class KeywordIndex:
+    """
+    跨批次的热词索引（SQLite），以 规范化关键词 + 地区 为键，
+    记录热词首次/最近出现时间、出现次数、最近一次的热词文件夹以及已生成的产物（图片、深度研究结果等）
+    采集时据此把每一行标记为 new（新热词）或 returning（之前批次出现过），
+    下游环节可以直接复用上一次的产物，而不是重复下载图片、重复深度研究
+    """
+
+    def __init__(self, path=None, logging=None, max_age_hours=None):
+        self.logging = logging or _logging.getLogger(__name__)
+        self.path = path or os.path.join(root_dir, os.getenv("KEYWORD_INDEX_PATH", "keyword_index.db"))
+        # 超过该时长的产物视为过期，不再复用
+        self.max_age = float(max_age_hours or os.getenv("KEYWORD_REUSE_HOURS", "24")) * 3600
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def observe(self, keyword, geo, hot_word_dir):
+        """
+        记录热词在本次采集中出现
+        :param hot_word_dir: 本次采集的热词文件夹
+        :return: {"status": "new"/"returning", "first_seen", "last_seen", "seen_count", "previous_dir"}
+        """
+        key, geo, hot_word_dir = normalize_keyword(keyword), geo or "", os.path.abspath(hot_word_dir)
+        now = time.time()
+        with self._lock, self._conn:
+            trend = self._conn.execute("SELECT * FROM trends WHERE keyword_key = ? AND geo = ?", (key, geo)).fetchone()
+            sighting = self._conn.execute("SELECT * FROM sightings WHERE hot_word_dir = ? AND keyword_key = ? "
+                                          "AND geo = ?", (hot_word_dir, key, geo)).fetchone()
+            if sighting is not None:
+                # 同一个文件夹重复登记（如任务重跑），保持原有标记
+                status, previous_dir = sighting["status"], sighting["previous_dir"]
+            elif trend is None:
+                status, previous_dir = "new", None
+            else:
+                status, previous_dir = "returning", trend["last_dir"]
+
+            if trend is None:
+                self._conn.execute("INSERT INTO trends (keyword_key, geo, keyword, first_seen, last_seen, last_dir) "
+                                   "VALUES (?, ?, ?, ?, ?, ?)", (key, geo, keyword, now, now, hot_word_dir))
+                first_seen, seen_count = now, 1
+            else:
+                seen_count = trend["seen_count"] + (sighting is None)
+                self._conn.execute("UPDATE trends SET keyword = ?, last_seen = ?, seen_count = ?, last_dir = ? "
+                                   "WHERE keyword_key = ? AND geo = ?",
+                                   (keyword, now, seen_count, hot_word_dir, key, geo))
+                first_seen = trend["first_seen"]
+            self._conn.execute("INSERT OR REPLACE INTO sightings (hot_word_dir, keyword_key, geo, status, previous_dir, "
+                               "seen_at) VALUES (?, ?, ?, ?, ?, ?)",
+                               (hot_word_dir, key, geo, status, previous_dir, now))
+        return {"status": status, "first_seen": first_seen, "last_seen": now, "seen_count": seen_count,
+                "previous_dir": previous_dir}
+
+    def _trend_for_dir(self, hot_word_dir):
+        row = self._conn.execute(
+            "SELECT s.status, s.previous_dir, t.* FROM sightings s "
+            "JOIN trends t ON t.keyword_key = s.keyword_key AND t.geo = s.geo WHERE s.hot_word_dir = ?",
+            (os.path.abspath(hot_word_dir),)).fetchone()
+        return row
+
+    def lookup(self, hot_word_dir):
+        """按热词文件夹查询索引记录，未登记时返回 None"""
+        with self._lock:
+            row = self._trend_for_dir(hot_word_dir)
+        if row is None:
+            return None
+        record = dict(row)
+        record["artifacts"] = json.loads(record["artifacts"])
+        return record
+
+    def add_artifact(self, hot_word_dir, name, path, count=None, total=None):
+        """
+        登记热词文件夹中已生成的产物，如 images、research_zh
+        :param count: 产物中成功生成的文件数（如成功下载的图片数），为 None 时不记录
+        :param total: 应生成的文件数，count < total 的产物不完整，之后不会被复用
+        """
+        with self._lock, self._conn:
+            row = self._trend_for_dir(hot_word_dir)
+            if row is None:
+                return
+            artifacts = json.loads(row["artifacts"])
+            artifacts[name] = {"path": os.path.abspath(path), "updated": time.time()}
+            if count is not None:
+                artifacts[name].update(count=count, total=count if total is None else total)
+            self._conn.execute("UPDATE trends SET artifacts = ? WHERE keyword_key = ? AND geo = ?",
+                               (json.dumps(artifacts, ensure_ascii=False), row["keyword_key"], row["geo"]))
+
+    def previous_artifact(self, hot_word_dir, name):
+        """
+        回访热词在之前批次中生成的、未过期、完整且仍存在的产物路径
+        新热词或产物不可用时返回 None
+        """
+        artifact = self._previous_artifact(hot_word_dir, name)
+        return artifact["path"] if artifact else None
+
+    def _previous_artifact(self, hot_word_dir, name):
+        record = self.lookup(hot_word_dir)
+        if record is None or record["status"] != "returning":
+            return None
+        artifact = record["artifacts"].get(name)
+        if not artifact or time.time() - artifact["updated"] > self.max_age:
+            return None
+        if artifact["path"].startswith(os.path.abspath(hot_word_dir) + os.sep):
+            return None
+        # 部分文件生成失败的产物不完整；登记后被删除的文件也使产物不完整
+        count = artifact.get("count", 1)
+        if count < artifact.get("total", count) or _count_files(artifact["path"]) < max(count, 1):
+            return None
+        return artifact
+
+    def reuse_artifact(self, hot_word_dir, name, target):
+        """
+        将之前批次的产物（文件夹）复制到本次热词文件夹的 target 位置，并登记为本次的产物
+        :return: 是否复用成功
+        """
+        artifact = self._previous_artifact(hot_word_dir, name)
+        if artifact is None:
+            return False
+        source = artifact["path"]
+        try:
+            shutil.copytree(source, target, dirs_exist_ok=True)
+        except Exception as e:
+            self.logging.warning(f"复用 {source} 失败: {e}")
+            return False
+        self.add_artifact(hot_word_dir, name, target, artifact.get("count"), artifact.get("total"))
+        return True
+
+    def reuse_research(self, hot_word_dir, language):
+        """
+        复用回访热词上一次的深度研究结果：复制 md 文件夹（含已渲染的 html/图片/视频），
+        并把上一次 CSV 中的研究字段写入本次的 CSV 行
+        :return: 是否复用成功
+        """
+        name = f"research_{language}"
+        source = self.previous_artifact(hot_word_dir, name)
+        if source is None:
+            return False
+        if not _copy_csv_fields(source, hot_word_dir, RESEARCH_FIELDS):
+            return False
+        return self.reuse_artifact(hot_word_dir, name, os.path.join(hot_word_dir, "md"))
+
+
+async def track_download(keyword_index, hot_word_dir, name, path, download):
+    """
+    等待下载任务完成后再登记产物，记录成功下载的数量，全部失败时不登记
+    :param download: 返回 True/False 列表的下载协程，如 ImageUtils.download_many
+    :return: 下载结果列表
+    """
+    results = await download
+    if keyword_index and any(results):
+        keyword_index.add_artifact(hot_word_dir, name, path, count=sum(results), total=len(results))
+    return results
+
+
+def _csv_path(hot_word_dir):
+    return os.path.join(os.path.dirname(hot_word_dir), os.getenv("HOT_WORDS_FILE_NAME", "hot_words.csv"))
+
+
+def _copy_csv_fields(source_md_dir, hot_word_dir, fields):
+    """从上一批次热词所在任务的 CSV 中取出研究字段，写入本次任务 CSV 中对应的行"""
+    source_dir = os.path.dirname(source_md_dir)
+    source_csv, target_csv = _csv_path(source_dir), _csv_path(hot_word_dir)
+    if not (os.path.isfile(source_csv) and os.path.isfile(target_csv)):
+        return False
+    with open(source_csv, 'r', newline='', encoding='utf-8-sig') as csvfile:
+        source_row = next((row for row in csv.DictReader(csvfile)
+                           if row['hot_word'] == os.path.basename(source_dir)), None)
+    if not source_row or not source_row.get("output"):
+        return False
+
+    with open(target_csv, 'r', newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.DictReader(csvfile)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+    hot_word = os.path.basename(hot_word_dir)
+    for row in rows:
+        if row['hot_word'] == hot_word:
+            row.update({field: source_row.get(field, '') for field in fields if field in fieldnames})
+    with open(target_csv, 'w', newline='', encoding='utf-8-sig') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    return True
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_keyword_index(logging=None):
+    """获取全局唯一的热词索引，KEYWORD_INDEX=false 时返回 None"""
+    global _index
+    if os.getenv("KEYWORD_INDEX", "true").lower() != "true":
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = KeywordIndex(logging=logging)
+    return _index
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+__all__ = ["TokenBucket", "get_rate_limiter", "get_host_rate_limiter"]
+
+# 各服务的默认限速：(次数, 秒数, 突发容量)，可用环境变量 RATE_LIMIT_<服务名> 覆盖
+# 云端模型（llm_cloud）默认不限速，并发由 LLM_CLOUD_CONCURRENCY 控制，需要按服务商配额限速时再配置 RATE_LIMIT_LLM_CLOUD
+DEFAULT_LIMITS = {
+    "trends": (1, 1, 1),
+    "serper": (5, 1, 5),
+    "ddg": (1, 3, 1),
+    "llm_local": (10, 1, 10),
+}
+
+
+def _env_name(name):
+    return "RATE_LIMIT_" + re.sub(r"[^0-9A-Za-z]", "_", name).upper()
+
+
+def _parse_limit(value):
+    """
+    解析限速配置，格式为 “次数/秒数” 或 “次数/秒数,突发容量”，如 5/1、1/3,2
+    配置为 0 或 off 时不限速，返回 None
+    """
+    value = value.strip().lower()
+    if value in ("", "0", "off", "false", "none"):
+        return None
+    rate_part, _, burst = value.partition(",")
+    count, _, period = rate_part.partition("/")
+    count, period = float(count), float(period or 1)
+    burst = float(burst) if burst else max(count, 1)
+    return count, period, burst
+
+
+class TokenBucket:
+    """
+    令牌桶：按 rate 个/秒 匀速补充令牌，最多积累 capacity 个
+    令牌不足时预占令牌并算出需要等待的时间，线程中用 acquire 阻塞等待，协程中用 acquire_async 让出事件循环，
+    多个线程、多个事件循环共用同一个令牌桶时也不会超过限速
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens=1):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """在线程中获取令牌，返回实际等待的秒数"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=1):
+        """在协程中获取令牌，等待期间不阻塞事件循环，返回实际等待的秒数"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class _Unlimited:
+    """未配置限速时使用，调用方无需判断"""
+
+    def acquire(self, tokens=1):
+        return 0
+
+    async def acquire_async(self, tokens=1):
+        return 0
+
+
+_UNLIMITED = _Unlimited()
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(name):
+    """
+    获取某个服务的全局令牌桶（进程内唯一），限速读取自环境变量 RATE_LIMIT_<服务名>，未配置时使用 DEFAULT_LIMITS
+    """
+    with _buckets_lock:
+        if name not in _buckets:
+            value = os.getenv(_env_name(name))
+            limit = _parse_limit(value) if value is not None else DEFAULT_LIMITS.get(name)
+            if limit is None:
+                _buckets[name] = _UNLIMITED
+            else:
+                count, period, burst = limit
+                _buckets[name] = TokenBucket(name, count / period, burst)
+        return _buckets[name]
+
+
+def get_host_rate_limiter(url):
+    """按域名限速，如 RATE_LIMIT_WWW_BBC_COM=1/2；未配置的域名不限速"""
+    return get_rate_limiter((urlparse(url).hostname or "").lower())
@@ -0,0 +1,169 @@
+import base64
+import json
+import logging as _logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from dotenv import load_dotenv
+from playwright.async_api import async_playwright
+
+from webui.utils.constant import root_dir
+from .browser_utils import launch_browser, new_context
+from .crawler import crawl_google_trends_page
+
+# 加载.env文件中的环境变量
+load_dotenv()
+
+__all__ = ["HarReplay", "record_trends_har", "replay_page", "default_har_path"]
+
+# 录制文件存放目录（录制内容包含 cookies，已加入 .gitignore）
+REPLAY_DIR = os.path.join(root_dir, "replay")
+
+# batchexecute 请求中每次会话都会变化的参数，回放匹配时忽略
+_VOLATILE_QUERY_PARAMS = {"_reqid", "f.sid", "bl", "rt"}
+_VOLATILE_FORM_PARAMS = {"at"}
+# 回放时响应体已解压，不能再带这些头
+_SKIP_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def default_har_path(origin="US", category=0):
+    return os.path.join(REPLAY_DIR, f"trends_{origin}_{category}.har")
+
+
+def _normalize_url(url):
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k not in _VOLATILE_QUERY_PARAMS)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}?{urlencode(query)}"
+
+
+def _normalize_body(body):
+    """表单请求体只保留稳定字段（如 batchexecute 的 f.req），其他请求体原样比较"""
+    if not body:
+        return ""
+    try:
+        pairs = parse_qsl(body, keep_blank_values=True, strict_parsing=True)
+    except ValueError:
+        return body
+    return urlencode(sorted((k, v) for k, v in pairs if k not in _VOLATILE_FORM_PARAMS))
+
+
+class HarReplay:
+    """
+    离线回放：从录制的 HAR 文件中按请求返回响应，不访问 Google 和代理
+    与 Playwright 自带的 route_from_har 相比，匹配时忽略 _reqid、f.sid、at 等每次会话都会变化的参数，
+    使录制后的 batchexecute 接口（热词列表、关联新闻）可以稳定回放
+    同一请求录制了多次时按录制顺序依次返回，用完后重复返回最后一次；未录制的请求直接中止并计数
+    """
+
+    def __init__(self, har_path, logging=None):
+        self.logging = logging or _logging.getLogger(__name__)
+        self.har_path = har_path
+        self.hits = 0
+        self.misses = 0
+        self.missed_urls = []
+        self._exact = {}
+        self._loose = {}
+        self._served = {}
+        with open(har_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)["log"]["entries"]
+        for entry in entries:
+            request, response = entry["request"], entry["response"]
+            # 录制时被拦截或失败的请求没有有效响应
+            if response.get("status", 0) <= 0:
+                continue
+            method = request["method"].upper()
+            url = _normalize_url(request["url"])
+            body = _normalize_body((request.get("postData") or {}).get("text"))
+            self._exact.setdefault((method, url, body), []).append(response)
+            self._loose.setdefault((method, url), []).append(response)
+        self.logging.info(f"已加载回放文件 {har_path}，共 {len(self._loose)} 个地址")
+
+    def _match(self, method, url, body):
+        method, url = method.upper(), _normalize_url(url)
+        for index, key in ((self._exact, (method, url, _normalize_body(body))), (self._loose, (method, url))):
+            responses = index.get(key)
+            if responses:
+                served = self._served.get(key, 0)
+                self._served[key] = served + 1
+                return responses[min(served, len(responses) - 1)]
+        return None
+
+    async def install(self, target):
+        """在 BrowserContext 或 Page 上注册回放路由"""
+        await target.route("**/*", self._handle_route)
+        return self
+
+    async def uninstall(self, target):
+        try:
+            await target.unroute("**/*", self._handle_route)
+        except Exception as e:
+            self.logging.debug(f"移除回放路由失败: {e}")
+
+    async def _handle_route(self, route):
+        request = route.request
+        response = self._match(request.method, request.url, request.post_data)
+        if response is None:
+            self.misses += 1
+            self.missed_urls.append(request.url)
+            self.logging.debug(f"回放文件中没有该请求: {request.method} {request.url}")
+            await route.abort()
+            return
+        self.hits += 1
+        content = response.get("content") or {}
+        body = content.get("text") or ""
+        body = base64.b64decode(body) if content.get("encoding") == "base64" else body.encode("utf-8")
+        headers = {header["name"]: header["value"] for header in response.get("headers", [])
+                   if header["name"].lower() not in _SKIP_RESPONSE_HEADERS}
+        await route.fulfill(status=response["status"], headers=headers, body=body)
+
+    def report(self):
+        message = f"回放统计：命中 {self.hits} 个请求，未命中 {self.misses} 个"
+        self.logging.info(message)
+        return message
+
+
+async def record_trends_har(logging, har_path=None, origin="US", category=0, nums=25, mode=None,
+                            url="https://trends.google.com/trending"):
+    """
+    在线采集一次趋势页，并将首屏与每个热词详情面板的请求录制为 HAR 文件，供离线回放和基准测试使用
+    :return: HAR 文件路径
+    """
+    har_path = har_path or default_har_path(origin, category)
+    os.makedirs(os.path.dirname(har_path), exist_ok=True)
+    os.environ.setdefault("HOT_WORDS_FILE_NAME", "hot_words.csv")
+    async with async_playwright() as p:
+        browser = await launch_browser(p, logging)
+        context = await new_context(browser, logging, record_har_path=har_path, record_har_content="embed")
+        page = await context.new_page()
+        try:
+            with tempfile.TemporaryDirectory(prefix="trends_record_") as task_dir:
+                await crawl_google_trends_page(page, logging, origin=origin, category=category, url=url,
+                                               task_dir=task_dir, to_download_image=False, nums=nums, mode=mode,
+                                               use_keyword_index=False)
+        finally:
+            # HAR 文件在上下文关闭时写入
+            await context.close()
+            await browser.close()
+    logging.info(f"趋势页已录制至 {har_path}")
+    return har_path
+
+
+@asynccontextmanager
+async def replay_page(har_path, logging):
+    """
+    打开一个所有请求都由 HAR 文件回放的页面
+    用法：async with replay_page(har_path, logger) as (page, replay): ...
+    """
+    async with async_playwright() as p:
+        browser = await launch_browser(p, logging)
+        context = await new_context(browser, logging)
+        replay = await HarReplay(har_path, logging).install(context)
+        page = await context.new_page()
+        try:
+            yield page, replay
+        finally:
+            await context.close()
+            await browser.close()
@@ -0,0 +1,127 @@
+import csv
+import logging as _logging
+import os
+from abc import ABC, abstractmethod
+
+from dotenv import load_dotenv
+
+# 加载.env文件中的环境变量
+load_dotenv()
+
+__all__ = ["HOT_WORDS_FIELDNAMES", "ResultSink", "CsvResultSink", "register_result_sink", "get_result_sink"]
+
+# 热词表格的列，agent/main.get_info_by_hot_word、SupervisorNode 和 Web 页面都按此读取
+HOT_WORDS_FIELDNAMES = ['hot_word',
+                        'search_volume',
+                        'search_growth_rate',
+                        "search_active_time",
+                        "relation_news",
+                        "search_history",
+                        "highlights",
+                        "chinese",
+                        "output",
+                        "result"]
+
+
+class ResultSink(ABC):
+    """
+    采集结果的写入端：一次采集任务内打开一次，逐行 write，结束时 close
+    新的存储后端继承本类并通过 register_result_sink 注册，即可用 RESULT_SINK 环境变量切换
+    """
+
+    def __init__(self, task_dir, logging=None):
+        self.task_dir = task_dir
+        self.logging = logging or _logging.getLogger(__name__)
+        self.rows = 0
+
+    @abstractmethod
+    def write(self, row):
+        """写入一行采集结果（字典，键为 HOT_WORDS_FIELDNAMES 中的列）"""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvResultSink(ResultSink):
+    """
+    热词 CSV 写入端：整个任务只打开一次文件、只创建一次 DictWriter，按批写入并 flush，
+    每 fsync_every 行做一次 fsync 检查点（0 表示只在结束时 fsync）
+    文件路径、列顺序和 utf-8-sig 编码与原逐行追加的方式一致
+    """
+
+    def __init__(self, task_dir, logging=None, file_name=None, batch_size=None, fsync_every=None):
+        super().__init__(task_dir, logging)
+        self.csv_file_path = os.path.join(task_dir, file_name or os.getenv("HOT_WORDS_FILE_NAME", "hot_words.csv"))
+        self.batch_size = max(int(batch_size or os.getenv("CSV_BATCH_SIZE", "10")), 1)
+        self.fsync_every = int(fsync_every if fsync_every is not None else os.getenv("CSV_FSYNC_EVERY", "0"))
+        self._file = None
+        self._writer = None
+        self._buffer = []
+        self._unsynced = 0
+
+    def _open(self):
+        # 首次写入时才创建文件，没有采集到数据时不产生空表格
+        os.makedirs(self.task_dir, exist_ok=True)
+        file_exists = os.path.isfile(self.csv_file_path) and os.path.getsize(self.csv_file_path) > 0
+        self._file = open(self.csv_file_path, 'a', newline='', encoding='utf-8-sig')
+        self._writer = csv.DictWriter(self._file, fieldnames=HOT_WORDS_FIELDNAMES)
+        if not file_exists:
+            self._writer.writeheader()
+
+    def write(self, row):
+        self._buffer.append({name: row.get(name, '') for name in HOT_WORDS_FIELDNAMES})
+        self.rows += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self, sync=False):
+        if self._buffer:
+            if self._file is None:
+                self._open()
+            self._writer.writerows(self._buffer)
+            self._unsynced += len(self._buffer)
+            self._buffer = []
+        if self._file is None:
+            return
+        self._file.flush()
+        if self._unsynced and (sync or (self.fsync_every and self._unsynced >= self.fsync_every)):
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        try:
+            self.flush(sync=True)
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._writer = None
+                self.logging.info(f"已写入 {self.rows} 个关键词至 CSV 文件：{self.csv_file_path}")
+
+
+_SINKS = {"csv": CsvResultSink}
+
+
+def register_result_sink(name, sink_class):
+    """注册新的结果写入后端"""
+    _SINKS[name.lower()] = sink_class
+
+
+def get_result_sink(task_dir, logging=None, backend=None):
+    """
+    按名称创建结果写入端，默认读取环境变量 RESULT_SINK（默认 csv）
+    """
+    backend = (backend or os.getenv("RESULT_SINK", "csv")).lower()
+    if backend not in _SINKS:
+        (logging or _logging).warning(f"未知的结果写入后端 {backend}，使用 csv")
+        backend = "csv"
+    return _SINKS[backend](task_dir, logging)
@@ -0,0 +1,141 @@
+import logging as _logging
+import os
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+# 加载.env文件中的环境变量
+load_dotenv()
+
+__all__ = ["RouteFilter"]
+
+# 默认拦截的广告、统计类域名（包含子域名）
+DEFAULT_BLOCK_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "adservice.google.com",
+)
+
+# 被拦截的请求无法得知真实大小，按资源类型的经验值估算节省的流量（字节）
+_ESTIMATED_SIZES = {
+    "image": 30 * 1024,
+    "media": 500 * 1024,
+    "font": 40 * 1024,
+    "stylesheet": 20 * 1024,
+    "script": 50 * 1024,
+}
+_DEFAULT_ESTIMATED_SIZE = 5 * 1024
+
+
+def _split_env(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return tuple(default)
+    return tuple(item.strip().lower() for item in value.split(",") if item.strip())
+
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+class RouteFilter:
+    """
+    请求路由过滤器：按资源类型和域名拦截无用请求（字体、广告、统计、按需拦截图片），
+    并统计本次运行中拦截/放行的请求数与流量，代理按流量计费时可直接节省带宽和页面加载时间
+    可安装在 BrowserContext 或 Page 上
+    """
+
+    def __init__(self, logging=None, block_types=(), block_domains=DEFAULT_BLOCK_DOMAINS, enabled=True):
+        self.logging = logging or _logging.getLogger(__name__)
+        self.block_types = {t.lower() for t in block_types}
+        self.block_domains = tuple(d.lower() for d in block_domains)
+        self.enabled = enabled
+        self.blocked = 0
+        self.allowed = 0
+        self.allowed_bytes = 0
+        self.saved_bytes = 0
+        self.blocked_by_type = {}
+
+    @classmethod
+    def for_crawl(cls, logging=None, block_images=True):
+        """采集用策略：默认拦截字体、音视频、广告统计，不下载图片时一并拦截图片"""
+        block_types = set(_split_env("ROUTE_BLOCK_TYPES", ("font", "media")))
+        if block_images:
+            block_types.add("image")
+        return cls(logging,
+                   block_types=block_types,
+                   block_domains=_split_env("ROUTE_BLOCK_DOMAINS", DEFAULT_BLOCK_DOMAINS),
+                   enabled=os.getenv("ROUTE_FILTER", "true").lower() == "true")
+
+    @classmethod
+    def for_render(cls, logging=None):
+        """渲染用策略：海报依赖字体和图片，只拦截广告统计类域名"""
+        return cls(logging,
+                   block_types=(),
+                   block_domains=_split_env("ROUTE_BLOCK_DOMAINS", DEFAULT_BLOCK_DOMAINS),
+                   enabled=os.getenv("ROUTE_FILTER", "true").lower() == "true")
+
+    def should_block(self, resource_type, url):
+        if resource_type in self.block_types:
+            return True
+        host = (urlparse(url).hostname or "").lower()
+        return any(host == domain or host.endswith("." + domain) for domain in self.block_domains)
+
+    async def install(self, target):
+        """在 BrowserContext 或 Page 上注册路由"""
+        if not self.enabled:
+            return self
+        await target.route("**/*", self._handle_route)
+        target.on("response", self._on_response)
+        return self
+
+    async def uninstall(self, target):
+        if not self.enabled:
+            return
+        target.remove_listener("response", self._on_response)
+        try:
+            await target.unroute("**/*", self._handle_route)
+        except Exception as e:
+            self.logging.debug(f"移除请求路由失败: {e}")
+
+    async def _handle_route(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked += 1
+            self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+            self.saved_bytes += _ESTIMATED_SIZES.get(request.resource_type, _DEFAULT_ESTIMATED_SIZE)
+            await route.abort()
+        else:
+            self.allowed += 1
+            # 交给后续路由处理（如离线回放），没有其他路由时正常发出请求
+            await route.fallback()
+
+    def _on_response(self, response):
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            self.allowed_bytes += int(content_length)
+
+    def stats(self):
+        return {
+            "blocked": self.blocked,
+            "allowed": self.allowed,
+            "allowed_bytes": self.allowed_bytes,
+            "saved_bytes": self.saved_bytes,
+            "blocked_by_type": dict(self.blocked_by_type),
+        }
+
+    def report(self, name=""):
+        """输出本次运行的请求过滤统计"""
+        message = (f"{name}请求过滤统计：拦截 {self.blocked} 个，放行 {self.allowed} 个，"
+                   f"放行流量 {_format_bytes(self.allowed_bytes)}，估算节省流量 {_format_bytes(self.saved_bytes)}，"
+                   f"按类型拦截 {self.blocked_by_type}")
+        if self.enabled:
+            self.logging.info(message)
+        return message
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import re
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+from aiohttp_socks import ProxyConnector
+from dotenv import load_dotenv
+
+from .image_utils import ImageUtils, HEADERS
+from .keyword_index import get_keyword_index, format_trend_status, reuse_images_enabled, track_download
+from .result_sink import get_result_sink
+from .trends_parser import format_search_volume, format_active_time
+from .rate_limiter import get_rate_limiter
+
+# 加载.env文件中的环境变量
+load_dotenv()
+
+__all__ = ["TRENDS_RSS_URL", "parse_trending_rss", "fetch_trending_rss", "crawl_google_trends_rss"]
+
+# 趋势页对应的 RSS 地址，只支持按地区筛选
+TRENDS_RSS_URL = "https://trends.google.com/trending/rss"
+
+
+def _local_name(tag):
+    """去掉命名空间，新旧两版 RSS 的 ht: 命名空间地址不同"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _children(element):
+    values = {}
+    for child in element:
+        values.setdefault(_local_name(child.tag), child)
+    return values
+
+
+def _text(element):
+    return re.sub(r"\s+", " ", element.text or '').strip() if element is not None else ''
+
+
+def _parse_traffic(traffic):
+    """approx_traffic 形如 “2,000+”，转换为与页面一致的 “2K+”"""
+    digits = re.sub(r"[^\d]", "", traffic or '')
+    return format_search_volume(int(digits)) if digits else (traffic or '')
+
+
+def _parse_pub_date(pub_date):
+    try:
+        return parsedate_to_datetime(pub_date).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_trending_rss(text, now=None):
+    """
+    解析趋势 RSS
+    :param text: RSS 文本
+    :return: 热词字典列表，字段与 trends_parser.parse_trending_items 保持一致，另含 news 列表
+             RSS 不提供搜索增长率，search_growth_rate 为空
+    """
+    root = ET.fromstring(text)
+    trends = []
+    for item in root.iter():
+        if _local_name(item.tag) != "item":
+            continue
+        fields = _children(item)
+        keyword = _text(fields.get("title"))
+        if not keyword:
+            continue
+        news = []
+        for child in item:
+            if _local_name(child.tag) != "news_item":
+                continue
+            news_fields = _children(child)
+            title = _text(news_fields.get("news_item_title"))
+            if title:
+                news.append({
+                    "title": title,
+                    "url": _text(news_fields.get("news_item_url")),
+                    "source": _text(news_fields.get("news_item_source")),
+                    "image": _text(news_fields.get("news_item_picture")),
+                })
+        started = _parse_pub_date(_text(fields.get("pubDate")))
+        trends.append({
+            "hot_word": keyword,
+            "search_volume": _parse_traffic(_text(fields.get("approx_traffic"))),
+            "search_growth_rate": '',
+            "search_active_time": format_active_time(started, now=now),
+            "started_timestamp": started,
+            "picture": _text(fields.get("picture")),
+            "news": news,
+        })
+    return trends
+
+
+async def fetch_trending_rss(logging, origin="", url=TRENDS_RSS_URL, proxy_url=None, timeout=15):
+    """
+    请求趋势 RSS（代理读取自环境变量 PROXY_URL）
+    :return: RSS 文本
+    """
+    proxy_url = proxy_url if proxy_url is not None else os.getenv("PROXY_URL")
+    connector = ProxyConnector.from_url(proxy_url) if proxy_url else aiohttp.TCPConnector()
+    params = {"geo": origin} if origin else None
+    headers = {**HEADERS, "Accept-Language": os.getenv("ACCEPT_LANGUAGE", "en-US,en;q=0.9")}
+    await get_rate_limiter("trends").acquire_async()
+    async with aiohttp.ClientSession(connector=connector, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            text = await response.text()
+    logging.info(f"趋势 RSS 请求完成：{url}，地区：{origin or '默认'}")
+    return text
+
+
+async def crawl_google_trends_rss(logging, origin="", category=0, task_dir=None, to_download_image=False, nums=25,
+                                  url=TRENDS_RSS_URL):
+    """
+    不启动浏览器，通过趋势 RSS 采集热词、搜索量和关联新闻标题，
+    生成与 crawl_google_trends_page 相同的热词 CSV 和热词文件夹
+    :param category: RSS 不支持分类筛选，传入时仅记录警告
+    """
+    if category != 0:
+        logging.warning(f"RSS 采集不支持分类筛选，分类编码 {category} 将被忽略")
+    try:
+        text = await fetch_trending_rss(logging, origin=origin, url=url)
+        trends = parse_trending_rss(text)[:nums]
+    except Exception as e:
+        logging.error(f"趋势 RSS 采集失败: {e}")
+        return
+
+    image_tasks = []
+    keyword_index = get_keyword_index(logging)
+    async with ImageUtils(os.getenv("PROXY_URL")) as image_util:
+        with get_result_sink(task_dir, logging) as sink:
+            for i, trend in enumerate(trends):
+                text_content = f"{i + 1}-{trend['hot_word']}"
+                title_new = [f"标题{index + 1}:{item['title']}" for index, item in enumerate(trend["news"])]
+                for title_text in title_new:
+                    logging.info(f"关键词{text_content}：{title_text}")
+
+                hot_word_dir = os.path.join(task_dir, text_content)
+                os.makedirs(hot_word_dir, exist_ok=True)
+                if keyword_index:
+                    status = keyword_index.observe(trend['hot_word'], origin, hot_word_dir)
+                    logging.info(f"关键词{text_content}：{format_trend_status(status)}")
+                images_dir = os.path.join(hot_word_dir, "new_images")
+                if to_download_image and keyword_index and reuse_images_enabled() and \
+                        keyword_index.reuse_artifact(hot_word_dir, "images", images_dir):
+                    logging.info(f"关键词{text_content}：复用之前批次下载的图片，跳过下载")
+                elif to_download_image:
+                    img_src_list = [item["image"] for item in trend["news"] if item["image"]] or \
+                                   [src for src in [trend["picture"]] if src]
+                    logging.info(f"关键词{text_content}：图片数量：{len(img_src_list)}")
+                    if len(img_src_list) < 3:
+                        logging.warning(f"关键词{text_content}：图片数量不足3张，请注意")
+                    image_tasks.append(asyncio.create_task(track_download(
+                        keyword_index, hot_word_dir, "images", images_dir, image_util.download_many(logging, [
+                            (src, images_dir, f"{text_content}_{index}.jpg")
+                            for index, src in enumerate(img_src_list)
+                        ]))))
+
+                sink.write({'hot_word': text_content,
+                            'search_volume': trend["search_volume"],
+                            'search_growth_rate': trend["search_growth_rate"],
+                            "search_active_time": trend["search_active_time"],
+                            "relation_news": '---'.join(title_new)})
+                logging.info(f"关键词 {text_content} ,搜索量：{trend['search_volume']}，"
+                             f"搜索活跃时间：{trend['search_active_time']}")
+
+        if image_tasks:
+            results = await asyncio.gather(*image_tasks)
+            logging.info(f"图片下载完成，成功 {sum(sum(result) for result in results)} 张，"
+                         f"共 {sum(len(result) for result in results)} 张")
+    logging.info(f"地区编码：{origin}，RSS 采集任务已完成，共采集了{len(trends)}个关键词")
+
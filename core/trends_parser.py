@@ -0,0 +1,163 @@
+import json
+import re
+from datetime import datetime
+
+__all__ = ["decode_batchexecute", "parse_trending_items", "parse_news_items", "parse_trends_response",
+           "format_search_volume", "format_active_time", "TRENDING_RPC_ID", "NEWS_RPC_ID"]
+
+# Google Trends 趋势页使用的 batchexecute RPC 编号
+# i0OFE: 当前地区/分类的热词列表
+# w4opAf: 点击热词后右侧面板的关联新闻
+TRENDING_RPC_ID = "i0OFE"
+NEWS_RPC_ID = "w4opAf"
+
+# batchexecute 响应体以防 XSSI 前缀开头
+_XSSI_PREFIX = ")]}'"
+
+
+def _get(items, index, default=None):
+    """按下标安全取值，接口字段缺失或类型变化时返回默认值"""
+    if isinstance(items, list) and -len(items) <= index < len(items):
+        value = items[index]
+        return default if value is None else value
+    return default
+
+
+def _iter_json_chunks(text):
+    """
+    batchexecute 响应是 “长度行 + JSON 数组” 的分块格式，也可能只有一个 JSON 数组
+    这里不依赖长度行，直接用 raw_decode 顺序解析出所有 JSON 数组
+    """
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        start = text.find("[", pos)
+        if start == -1:
+            return
+        try:
+            chunk, end = decoder.raw_decode(text, start)
+        except ValueError:
+            pos = start + 1
+            continue
+        yield chunk
+        pos = end
+
+
+def decode_batchexecute(text):
+    """
+    解析 batchexecute 响应体
+    :param text: 响应文本
+    :return: [(rpc_id, payload), ...]，payload 为已反序列化的内层 JSON
+    """
+    if not text:
+        return []
+    if text.startswith(_XSSI_PREFIX):
+        text = text[len(_XSSI_PREFIX):]
+
+    results = []
+    for chunk in _iter_json_chunks(text):
+        for envelope in chunk if isinstance(chunk, list) else []:
+            if not (isinstance(envelope, list) and _get(envelope, 0) == "wrb.fr"):
+                continue
+            rpc_id = _get(envelope, 1)
+            raw_payload = _get(envelope, 2)
+            if not isinstance(raw_payload, str):
+                continue
+            try:
+                results.append((rpc_id, json.loads(raw_payload)))
+            except ValueError:
+                continue
+    return results
+
+
+def format_search_volume(volume):
+    """将接口返回的搜索量整数格式化为页面上的展示形式，如 200000 -> 200K+"""
+    if not isinstance(volume, (int, float)):
+        return str(volume or '')
+    for unit, size in (("B", 1_000_000_000), ("M", 1_000_000), ("K", 1_000)):
+        if volume >= size:
+            value = volume / size
+            value = int(value) if value == int(value) else round(value, 1)
+            return f"{value}{unit}+"
+    return f"{int(volume)}+"
+
+
+def format_active_time(started_timestamp, now=None):
+    """将热词开始活跃的时间戳格式化为相对时间，如 “5 hours ago”"""
+    if not isinstance(started_timestamp, (int, float)):
+        return ''
+    now = now or datetime.now().timestamp()
+    minutes = max(int((now - started_timestamp) // 60), 0)
+    if minutes < 60:
+        return f"{minutes} minutes ago"
+    hours = minutes // 60
+    if hours < 24:
+        return f"{hours} hours ago"
+    return f"{hours // 24} days ago"
+
+
+def parse_trending_items(payload, now=None):
+    """
+    解析 i0OFE 热词列表
+    单条热词的结构（按下标）：
+    0 关键词, 2 地区, 3 [开始时间戳], 6 搜索量, 8 增长率(%), 9 相关搜索词, 10 分类编号, 11 新闻令牌
+    :return: 热词字典列表
+    """
+    items = _get(payload, 1, [])
+    trends = []
+    for item in items if isinstance(items, list) else []:
+        keyword = _get(item, 0)
+        if not isinstance(keyword, str) or not keyword:
+            continue
+        started = _get(_get(item, 3, []), 0)
+        growth = _get(item, 8)
+        trends.append({
+            "hot_word": keyword,
+            "geo": _get(item, 2, ''),
+            "search_volume": format_search_volume(_get(item, 6)),
+            "search_growth_rate": f"{growth}%" if growth is not None else '',
+            "search_active_time": format_active_time(started, now=now),
+            "started_timestamp": started,
+            "related_queries": [q for q in _get(item, 9, []) if isinstance(q, str)],
+            "categories": [c for c in _get(item, 10, []) if isinstance(c, int)],
+            "news_tokens": [t for t in _get(item, 11, []) if isinstance(t, str)],
+        })
+    return trends
+
+
+def parse_news_items(payload):
+    """
+    解析 w4opAf 关联新闻
+    单条新闻的结构（按下标）：0 标题, 1 链接, 2 来源, 3 [发布时间戳], 4 图片地址
+    :return: 新闻字典列表
+    """
+    items = _get(payload, 0, [])
+    news = []
+    for item in items if isinstance(items, list) else []:
+        title = _get(item, 0)
+        if not isinstance(title, str) or not title:
+            continue
+        image = _get(item, 4, '')
+        news.append({
+            "title": re.sub(r"\s+", " ", title).strip(),
+            "url": _get(item, 1, ''),
+            "source": _get(item, 2, ''),
+            "published_timestamp": _get(_get(item, 3, []), 0),
+            "image": image if isinstance(image, str) else '',
+        })
+    return news
+
+
+def parse_trends_response(text, now=None):
+    """
+    解析一次 batchexecute 响应，按 RPC 类型汇总
+    :return: {"trends": [...], "news": [...]}
+    """
+    parsed = {"trends": [], "news": []}
+    for rpc_id, payload in decode_batchexecute(text):
+        if rpc_id == TRENDING_RPC_ID:
+            parsed["trends"].extend(parse_trending_items(payload, now=now))
+        elif rpc_id == NEWS_RPC_ID:
+            parsed["news"].extend(parse_news_items(payload))
+    return parsed
+
@@ -0,0 +1,145 @@
+import asyncio
+import csv
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from core.result_sink import HOT_WORDS_FIELDNAMES
+from core.rss_crawler import crawl_google_trends_rss, parse_trending_rss
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# Tue, 14 Nov 2023 22:13:20 +0000 之后 5 小时
+NOW = 1700000000 + 5 * 3600
+
+
+def _png():
+    buffer = BytesIO()
+    Image.new("RGB", (32, 24), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def trends_server():
+    """本地替身服务：/trending/rss 返回 RSS 样例，/images/*.png 返回图片，missing.png 返回 404"""
+    requests = []
+    image = _png()
+    with open(os.path.join(FIXTURES, "trending_rss.xml"), encoding="utf-8") as f:
+        template = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path.startswith("/trending/rss"):
+                body = template.replace("{base}", base).encode("utf-8")
+                content_type = "application/rss+xml; charset=utf-8"
+            elif self.path.startswith("/images/") and "missing" not in self.path:
+                body, content_type = image, "image/png"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    base = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield base, requests
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def offline_env(monkeypatch):
+    # 不走代理、不限速、不写全局热词索引
+    monkeypatch.setenv("PROXY_URL", "")
+    monkeypatch.setenv("KEYWORD_INDEX", "false")
+    monkeypatch.setenv("RESULT_SINK", "csv")
+    monkeypatch.setenv("HOT_WORDS_FILE_NAME", "hot_words.csv")
+    monkeypatch.setenv("RATE_LIMIT_TRENDS", "off")
+
+
+def _read_rows(task_dir):
+    with open(os.path.join(task_dir, "hot_words.csv"), encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == HOT_WORDS_FIELDNAMES
+        return list(reader)
+
+
+def test_parse_trending_rss():
+    with open(os.path.join(FIXTURES, "trending_rss.xml"), encoding="utf-8") as f:
+        trends = parse_trending_rss(f.read().replace("{base}", "http://img"), now=NOW)
+    assert [t["hot_word"] for t in trends] == ["bryce harper", "aurora borealis"]
+    harper, aurora = trends
+    assert harper["search_volume"] == "2K+"
+    assert harper["search_growth_rate"] == ""
+    assert harper["search_active_time"] == "5 hours ago"
+    assert harper["picture"] == "http://img/images/picture.png"
+    assert harper["news"] == [
+        {"title": "Bryce Harper leaves game", "url": "https://example.com/a", "source": "ESPN",
+         "image": "http://img/images/a.png"},
+        {"title": "Phillies update", "url": "https://example.com/b", "source": "AP",
+         "image": "http://img/images/missing.png"},
+    ]
+    assert aurora["search_volume"] == "500K+"
+    assert aurora["search_active_time"] == "7 hours ago"
+    assert aurora["news"] == []
+
+
+def test_crawl_writes_csv_and_hot_word_folders(trends_server, tmp_path):
+    base, requests = trends_server
+    task_dir = str(tmp_path)
+    asyncio.run(crawl_google_trends_rss(logging.getLogger("test"), origin="US", task_dir=task_dir,
+                                        url=f"{base}/trending/rss"))
+
+    assert requests == ["/trending/rss?geo=US"]
+    rows = _read_rows(task_dir)
+    assert [row["hot_word"] for row in rows] == ["1-bryce harper", "2-aurora borealis"]
+    assert rows[0]["search_volume"] == "2K+"
+    assert rows[0]["relation_news"] == "标题1:Bryce Harper leaves game---标题2:Phillies update"
+    assert rows[1]["search_volume"] == "500K+"
+    assert rows[1]["relation_news"] == ""
+    assert all(row["search_growth_rate"] == "" and row["search_active_time"] for row in rows)
+    assert sorted(os.listdir(task_dir)) == ["1-bryce harper", "2-aurora borealis", "hot_words.csv"]
+    # 未要求下载图片时不创建图片目录
+    assert os.listdir(os.path.join(task_dir, "1-bryce harper")) == []
+
+
+def test_crawl_downloads_news_images(trends_server, tmp_path):
+    base, requests = trends_server
+    task_dir = str(tmp_path)
+    asyncio.run(crawl_google_trends_rss(logging.getLogger("test"), task_dir=task_dir, to_download_image=True,
+                                        url=f"{base}/trending/rss"))
+
+    # 有新闻图片时只下载新闻图片（失败的跳过），没有新闻时使用热词配图
+    assert sorted(os.listdir(os.path.join(task_dir, "1-bryce harper", "new_images"))) == ["1-bryce harper_0.jpg"]
+    assert sorted(os.listdir(os.path.join(task_dir, "2-aurora borealis", "new_images"))) == \
+           ["2-aurora borealis_0.jpg"]
+    assert sorted(path for path in requests if path.startswith("/images/")) == \
+           ["/images/a.png", "/images/missing.png", "/images/picture.png"]
+    assert len(_read_rows(task_dir)) == 2
+
+
+def test_crawl_with_nums_limit(trends_server, tmp_path):
+    base, _ = trends_server
+    asyncio.run(crawl_google_trends_rss(logging.getLogger("test"), task_dir=str(tmp_path), nums=1,
+                                        url=f"{base}/trending/rss"))
+    assert [row["hot_word"] for row in _read_rows(str(tmp_path))] == ["1-bryce harper"]
+
+
+def test_crawl_failure_writes_nothing(trends_server, tmp_path):
+    base, _ = trends_server
+    asyncio.run(crawl_google_trends_rss(logging.getLogger("test"), task_dir=str(tmp_path),
+                                        url=f"{base}/not-found"))
+    assert os.listdir(str(tmp_path)) == []
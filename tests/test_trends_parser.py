@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from core.trends_parser import (NEWS_RPC_ID, TRENDING_RPC_ID, decode_batchexecute, parse_news_items,
+                                parse_trending_items, parse_trends_response)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# 固定“当前时间”，使相对时间的格式化结果可重复
+NOW = 1700000000 + 5 * 3600
+
+
+def _read(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(params=["batchexecute_single.txt", "batchexecute_chunked.txt"])
+def body(request):
+    """同一份数据的两种响应格式：单个 JSON 数组，以及“长度行 + JSON 数组”的分块格式"""
+    return _read(request.param)
+
+
+def test_decode_batchexecute_keeps_only_rpc_envelopes(body):
+    decoded = decode_batchexecute(body)
+    assert [rpc_id for rpc_id, _ in decoded] == [TRENDING_RPC_ID, NEWS_RPC_ID]
+    assert all(isinstance(payload, list) for _, payload in decoded)
+
+
+def test_decode_batchexecute_empty():
+    assert decode_batchexecute("") == []
+    assert decode_batchexecute(")]}'\n\n") == []
+
+
+def test_parse_trending_items(body):
+    payload = dict(decode_batchexecute(body))[TRENDING_RPC_ID]
+    trends = parse_trending_items(payload, now=NOW)
+    # 缺少关键词的条目被跳过
+    assert [t["hot_word"] for t in trends] == ["bryce harper", "harper"]
+    first, second = trends
+    assert first == {
+        "hot_word": "bryce harper",
+        "geo": "US",
+        "search_volume": "200K+",
+        "search_growth_rate": "1000%",
+        "search_active_time": "5 hours ago",
+        "started_timestamp": 1700000000,
+        "related_queries": ["harper injury", "phillies"],
+        "categories": [17],
+        "news_tokens": ["token-1", "token-2"],
+    }
+    assert second["search_volume"] == "1.5M+"
+    assert second["search_active_time"] == "6 hours ago"
+    assert second["related_queries"] == []
+    assert second["news_tokens"] == []
+
+
+def test_parse_news_items(body):
+    payload = dict(decode_batchexecute(body))[NEWS_RPC_ID]
+    news = parse_news_items(payload)
+    # 标题为空的条目被跳过，标题中的连续空白被合并
+    assert news == [
+        {"title": "Bryce Harper leaves game", "url": "https://example.com/a", "source": "ESPN",
+         "published_timestamp": 1700000100, "image": "https://example.com/a.jpg"},
+        {"title": "Phillies update", "url": "https://example.com/b", "source": "AP",
+         "published_timestamp": 1700000200, "image": ""},
+    ]
+
+
+def test_parse_trends_response_groups_by_rpc(body):
+    parsed = parse_trends_response(body, now=NOW)
+    assert [t["hot_word"] for t in parsed["trends"]] == ["bryce harper", "harper"]
+    assert [n["source"] for n in parsed["news"]] == ["ESPN", "AP"]
+
+
+def test_parse_items_tolerate_malformed_payload():
+    assert parse_trending_items(None) == []
+    assert parse_trending_items([None, "unexpected"]) == []
+    assert parse_news_items([]) == []
+    assert parse_news_items([[["title only"]]]) == [
+        {"title": "title only", "url": "", "source": "", "published_timestamp": None, "image": ""}]
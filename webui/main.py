@@ -1,9 +1,11 @@
 import argparse
 import os
+import threading
 
 import gradio as gr
 from dotenv import load_dotenv
 
+from agent.utils import get_llm_client
 from webui.utils.constant import root_dir
 from webui.views import (
     cookie_settings,
@@ -17,20 +19,26 @@ from webui.views import (
 )
 
 load_dotenv()
-import requests
 
-# 插入在 url 相关逻辑的位置
-# url = f"{os.getenv('LOCAL_LLM_URL')}" 如果变量不为空，则请求一下url，查看是否响应，不响应则gr报错，提示异常
-url = os.getenv('LOCAL_LLM_URL')
+# 启动时在后台线程中检查所有模型端点（LLM_ENDPOINTS，或 LOCAL_LLM_URL / CLOUD_API_URL），
+# 端点不可用时每个端点都要等到超时，放在后台避免阻塞页面启动；检查结果在页面加载后于顶部提示
+_endpoint_health = {}
+_health_thread = threading.Thread(target=lambda: _endpoint_health.update(get_llm_client().check_health()),
+                                  name="llm-health-check", daemon=True)
+_health_thread.start()
+
+
+def endpoint_health_notice():
+    _health_thread.join()
+    if not _endpoint_health:
+        return "⚠️ 未配置可用的模型：请配置 LOCAL_LLM_URL、LOCAL_MODEL_NAME 或 CLOUD_API_URL、CLOUD_MODEL_NAME（或 LLM_ENDPOINTS）。"
+    return "\n\n".join(f"⚠️ 模型端点 {name} 无法访问：请确认服务是否正在运行、模型是否已下载，以及地址是否配置正确。"
+                       for name, healthy in _endpoint_health.items() if not healthy)
+
 
 with gr.Blocks(title="GT") as app:
-    if url:
-        try:
-            response = requests.get(url,timeout=5)
-        except requests.exceptions.Timeout:
-            gr.Markdown("⚠️ 请求超时：服务响应时间过长，请检查本地大模型是否已正常运行。")
-        except requests.ConnectionError:
-            gr.Markdown("⚠️ 无法连接到服务：请确认服务是否正在运行，以及 LOCAL_LLM_URL 是否配置正确。")
+    health_notice = gr.Markdown()
+    app.load(endpoint_health_notice, outputs=health_notice)
 
     gr.Markdown("# Google Trends 热点采集、优质报道深度搜索、口播文案生成、口播语音生成、数字人生成、定时批量任务设置")
 
@@ -33,6 +33,8 @@ def save_cookie(cookie_str):
                     f.write(line)
             # 写入新的 COOKIE_STRING
             f.write(f'COOKIE_STRING="{cookie_str}"\n')
+        # 同步到当前进程，常驻浏览器在下一次任务前按新的 cookie 重建上下文
+        os.environ["COOKIE_STRING"] = cookie_str
 
         return "COOKIE_STRING 已成功保存"
     except Exception as e:
@@ -1,56 +1,149 @@
 # 新增 Gradio Web 页面
+import asyncio
 import datetime
 import os
 
 from dotenv import load_dotenv
 
-from core import get_logger, init_browser, crawl_google_trends_page, close_browser
+from core import get_logger, init_browser, crawl_google_trends_page, close_browser, BrowserContextPool, \
+    get_browser_manager, warm_browser_enabled, crawl_google_trends_rss
 from webui.utils.conf import load_regions_choices
 from webui.utils.constant import task_root_dir, root_dir
 
 load_dotenv()
 
-async def run_crawler(to_download_image, origin, category, nums=25):
+TRENDING_URL = "https://trends.google.com/trending"
+
+
+async def run_crawler(to_download_image, origin, category, nums=25, use_rss=None):
     """
     运行采集任务
+    :param use_rss: 是否使用 RSS 快速采集（不启动浏览器），默认读取环境变量 CRAWL_BACKEND
     :return: 爬取任务完成的消息
     """
-    url = "https://trends.google.com/trending"
+    url = TRENDING_URL
 
-    await start_crawler(url, to_download_image, origin=origin, category=category, nums=nums)
+    await start_crawler(url, to_download_image, origin=origin, category=category, nums=nums, use_rss=use_rss)
     return "热点采集任务已完成"
 
 
-async def start_crawler(url, to_download_image, origin="", category="", nums=25):
+async def run_multi_region_crawler(to_download_image, origins, categories, nums=25):
+    """
+    运行多地区、多分类并行采集任务
+    :param origins: 地区名称列表
+    :param categories: 分类名称列表
+    :return: 爬取任务完成的消息
+    """
+    if isinstance(origins, str):
+        origins = [origins]
+    if isinstance(categories, str):
+        categories = [categories]
+    pairs = [(origin, category) for origin in origins or [] for category in categories or []]
+    if not pairs:
+        return "请至少选择一个地区和一个分类"
+
+    failed = await start_multi_region_crawler(TRENDING_URL, to_download_image, pairs, nums=nums)
+    if failed:
+        return f"多地区热点采集任务已完成，共{len(pairs)}组，其中失败{len(failed)}组：{failed}"
+    return f"多地区热点采集任务已完成，共{len(pairs)}组"
+
+
+def _get_task_dir(task_date, origin, category):
+    """每个 地区/分类 组合对应一个独立的任务文件夹"""
+    return os.path.join(task_root_dir, task_date + f'_{origin}_{category}')
+
+
+def _get_codes(choices, origin, category):
+    origin_code = choices['regions'].get(origin, "US")  # 默认值为 "US"
+    category_code = int(choices['category_names'].get(category, "0"))  # 默认值为 "0"
+    return origin_code, category_code
+
+
+async def start_crawler(url, to_download_image, origin="", category="", nums=25, use_rss=None):
     """
     启动采集任务
     :param to_download_image:
     :type origin: string
     :param category:
     :param url: 目标URL
+    :param use_rss: 是否使用 RSS 快速采集，None 时读取环境变量 CRAWL_BACKEND（browser/rss）
     """
     task_date = datetime.datetime.now().strftime("%Y年%m月%d日%H时%M分")
     task_log_file_path = os.path.join(f"task_{task_date}.log")
     os.makedirs(os.path.join(root_dir, "logs"), exist_ok=True)
     # 获取当前时间并创建任务文件夹
-    task_dir_file_name = os.path.join(task_root_dir, task_date + f'_{origin}_{category}')
+    task_dir_file_name = _get_task_dir(task_date, origin, category)
     os.makedirs(task_root_dir, exist_ok=True)
 
     logger = get_logger(__name__, task_log_file_path)
 
-    p, browser, context, page = await init_browser(logger)
-
     choices = load_regions_choices()
-    origin_code = choices['regions'].get(origin, "US")  # 默认值为 "US"
-    category_code = int(choices['category_names'].get(category, "0"))  # 默认值为 "0"
+    origin_code, category_code = _get_codes(choices, origin, category)
+
+    if use_rss is None:
+        use_rss = os.getenv("CRAWL_BACKEND", "browser").lower() == "rss"
+    if use_rss:
+        # 只需要热词、搜索量和新闻标题时，直接读取 RSS，不启动浏览器
+        await crawl_google_trends_rss(logger, origin=origin_code, category=category_code,
+                                      task_dir=task_dir_file_name, to_download_image=to_download_image, nums=nums)
+        return
 
-    await crawl_google_trends_page(page, logger, origin=origin_code, category=category_code, url=url,
-                                   task_dir=task_dir_file_name,
-                                   to_download_image=to_download_image, nums=nums)
+    async def crawl(page):
+        await crawl_google_trends_page(page, logger, origin=origin_code, category=category_code, url=url,
+                                       task_dir=task_dir_file_name,
+                                       to_download_image=to_download_image, nums=nums)
+
+    if warm_browser_enabled():
+        # 复用常驻浏览器，任务结束后页面自动归还
+        await get_browser_manager(logger).run(crawl, logging=logger)
+        return
+
+    p, browser, context, page = await init_browser(logger)
+
+    await crawl(page)
 
     # 关闭页面和上下文
     await page.close()
     await context.close()
 
     # 关闭浏览器
-    await close_browser(p, browser, logger)
\ No newline at end of file
+    await close_browser(p, browser, logger)
+
+
+async def start_multi_region_crawler(url, to_download_image, pairs, nums=25, max_contexts=None):
+    """
+    在同一个浏览器中并行采集多个 (地区, 分类) 组合
+    :param url: 目标URL
+    :param to_download_image: 是否下载图片
+    :param pairs: [(地区名称, 分类名称), ...]
+    :param nums: 每个组合采集的热词数量
+    :param max_contexts: 最大并发上下文数量，默认读取环境变量 CRAWL_MAX_CONTEXTS
+    :return: 采集失败的组合列表
+    """
+    task_date = datetime.datetime.now().strftime("%Y年%m月%d日%H时%M分")
+    task_log_file_path = os.path.join(f"task_{task_date}.log")
+    os.makedirs(os.path.join(root_dir, "logs"), exist_ok=True)
+    os.makedirs(task_root_dir, exist_ok=True)
+
+    logger = get_logger(__name__, task_log_file_path)
+    choices = load_regions_choices()
+
+    async def crawl_pair(pool, origin, category):
+        origin_code, category_code = _get_codes(choices, origin, category)
+        async with pool.page() as page:
+            logger.info(f"开始采集 地区：{origin}，分类：{category}")
+            await crawl_google_trends_page(page, logger, origin=origin_code, category=category_code, url=url,
+                                           task_dir=_get_task_dir(task_date, origin, category),
+                                           to_download_image=to_download_image, nums=nums)
+
+    async with BrowserContextPool(logger, max_contexts=max_contexts) as pool:
+        results = await asyncio.gather(*[crawl_pair(pool, origin, category) for origin, category in pairs],
+                                       return_exceptions=True)
+
+    failed = []
+    for (origin, category), result in zip(pairs, results):
+        if isinstance(result, Exception):
+            logger.error(f"地区：{origin}，分类：{category} 采集失败: {result}")
+            failed.append(f"{origin}_{category}")
+    logger.info(f"多地区采集任务已完成，共{len(pairs)}组，失败{len(failed)}组")
+    return failed
@@ -5,13 +5,19 @@ from typing import List
 from lxml.isoschematron import extract_xsd
 
 from agent import hot_word_research_assistant
+from agent.utils import get_llm_client
+from agent.utils.structured import log_parse_stats
 from agent.tools.summary2md import generate_news_summary_report
-from core import get_logger
+from core import get_logger, get_keyword_index
 from webui.utils.constant import task_root_dir, root_dir
 from webui.utils.md2html import (get_random_bg_image, convert_md_to_output)
 from webui.utils.png2notion import extract_title, upload_image_and_create_notion_page
 
 
+def skip_returning_research_enabled():
+    return os.getenv("SKIP_RETURNING_RESEARCH", "false").lower() == "true"
+
+
 async def research_all_hot_word(task_folders, language):
     agent_log_file_path = f"agent_{datetime.datetime.now().strftime('%Y年%m月%d日%H时%M分')}.log"
 
@@ -23,18 +29,32 @@ async def research_all_hot_word(task_folders, language):
                          os.path.isdir(os.path.join(task_dir, d))]
 
     result = []
+    llm_savings = get_llm_client().savings()
+    keyword_index = get_keyword_index(agent_logger)
     print(f"开始处理热词文件夹：{hot_words_folders}")
     for hot_words_folders_path in hot_words_folders:
         try:
+            if keyword_index and skip_returning_research_enabled() and \
+                    keyword_index.reuse_research(hot_words_folders_path, language):
+                # 回访热词在有效期内已做过深度研究，直接复用研究结果和已渲染的 md/html/图片
+                print(f"回访热词，复用之前批次的研究结果：{hot_words_folders_path}")
+                result.append("[复用之前批次的研究结果]-[DONE]")
+                continue
             ret = hot_word_research_assistant(hot_words_folders_path, language, agent_logger)
             print(f"热词处理成功：{hot_words_folders}")
             print(f"查询md汇总文件,：{hot_words_folders}")
             input_md_path = load_summary_and_paths(hot_words_folders_path,language)
             await convert_md_file_to_img(input_md_path,language)
+            if keyword_index and input_md_path:
+                keyword_index.add_artifact(hot_words_folders_path, f"research_{language}",
+                                           os.path.dirname(input_md_path))
         except Exception as e:
             print(f"正在处理热词：{hot_words_folders_path}发生异常，下一个热词")
             continue
         result.append(ret)
+    get_llm_client().log_savings(agent_logger, since=llm_savings)
+    log_parse_stats(agent_logger)
+    get_llm_client().log_metrics(agent_logger)
     return result
 
 
@@ -94,6 +114,7 @@ async def md_to_img(hot_words_folders_path, language):
     agent_log_file_path = f"agent_{datetime.datetime.now().strftime('%Y年%m月%d日%H时%M分')}.log"
 
     agent_logger = get_logger(__name__, agent_log_file_path)
+    llm_savings = get_llm_client().savings()
     hot_words = os.path.basename(hot_words_folders_path)
     task_dir = os.path.dirname(hot_words_folders_path)
     hot_words_file_name = os.getenv("HOT_WORDS_FILE_NAME")
@@ -134,6 +155,7 @@ async def md_to_img(hot_words_folders_path, language):
     # print(f"正在将md转为图片、视频、html：{hot_words_folders_path}")
 
     await convert_md_file_to_img(input_md_path,language)
+    get_llm_client().log_savings(agent_logger, since=llm_savings)
     return "转换html、图片、视频成功"
 
 
@@ -142,12 +164,16 @@ async def research_hot_word(hot_words_folders_path, language):
     agent_log_file_path = f"agent_{datetime.datetime.now().strftime('%Y年%m月%d日%H时%M分')}.log"
 
     agent_logger = get_logger(__name__, agent_log_file_path)
+    llm_savings = get_llm_client().savings()
 
     ret = hot_word_research_assistant(hot_words_folders_path, language, agent_logger)
     print(f"热词处理成功：{hot_words_folders_path}")
     print(f"查询md汇总文件,：{hot_words_folders_path}")
     input_md_path = load_summary_and_paths(hot_words_folders_path,language)
     await convert_md_file_to_img(input_md_path, language)
+    get_llm_client().log_savings(agent_logger, since=llm_savings)
+    log_parse_stats(agent_logger)
+    get_llm_client().log_metrics(agent_logger)
     return ret
 
 
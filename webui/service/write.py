@@ -5,6 +5,7 @@ import os
 import pandas as pd
 
 from agent.main import write_in_style_assistant
+from agent.utils import get_llm_client
 from core import get_logger
 
 
@@ -73,6 +74,7 @@ def batch_gen_save_result(prompt, hot_word_csv_files_path, language="中文"):
     if not hot_word_csv_files_path or not prompt:
         return "参数不完整，无法保存"
 
+    llm_savings = get_llm_client().savings()
     try:
         # 读取CSV文件
         df = pd.read_csv(hot_word_csv_files_path, encoding='utf-8-sig')
@@ -109,6 +111,8 @@ def batch_gen_save_result(prompt, hot_word_csv_files_path, language="中文"):
 
         # 写回CSV文件
         df.to_csv(hot_word_csv_files_path, index=False, encoding='utf-8-sig')
+        saved = get_llm_client().savings(since=llm_savings)
+        print(f"LLM 缓存命中 {saved['hits']} 次，节省 {saved['tokens_saved']} 个 token、{saved['seconds_saved']:.1f} 秒")
         return "✅ 批量生成并保存成功"
     except Exception as e:
         print(f"批量生成和保存失败: {e}")
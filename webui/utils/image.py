@@ -22,7 +22,7 @@ def get_hot_word_images_and_narratives(hot_word_folder):
         return [], ""
 
     # 获取图片列表
-    images = [os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.endswith(('.jpg', '.png'))]
+    images = [os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.endswith(('.jpg', '.png', '.webp'))]
 
     # 获取 CSV 文件路径
     csv_files = [os.path.join(task_dir, f) for f in os.listdir(task_dir) if f.endswith('.csv')]
@@ -9,6 +9,9 @@ from bs4 import BeautifulSoup
 from moviepy import *
 import os
 from playwright.async_api import async_playwright
+
+from core.browser_manager import get_browser_manager, warm_browser_enabled
+from core.route_filter import RouteFilter
 from webui.utils.constant import root_dir
 
 
@@ -546,6 +549,96 @@ async def scroll_to_bottom(page, viewport_height=1920):
     return scroll_amount
 
 
+async def _render_html(browser, abs_html_path, image_path=None, video_path=None, mobile=False, duration=7000):
+    """
+    在给定浏览器中新建上下文渲染 HTML，截图并录屏
+    :return: 录屏的临时视频路径，未录屏时为 None
+    """
+    tmp_video_path = None
+    # 设置上下文（启用录屏）
+    context_args = {}
+    if video_path:
+        os.makedirs(os.path.dirname(video_path), exist_ok=True)
+        context_args.update(
+            record_video_dir=os.path.dirname(video_path),
+            record_video_size={"width": 1080, "height": 1920}
+        )
+
+    # 创建带录屏功能的上下文
+    context = await browser.new_context(**context_args)
+    # 拦截广告统计类请求
+    route_filter = await RouteFilter.for_render().install(context)
+    page = await context.new_page()
+
+    # 加载 HTML 页面
+    await page.goto(f"file://{abs_html_path}")
+
+    if mobile:
+        # 设置为 iPhone 12 视口 + 移动端 UA
+        await page.set_viewport_size({"width": 1080, "height": 1920})
+        await page.add_init_script("""
+            Object.defineProperty(navigator, 'userAgent', {
+                value: 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.4 (KHTML, like Gecko) Version/14.0 Mobile/15A5370a Safari/604.1',
+                configurable: false,
+                writable: false,
+                enumerable: true
+            })
+        """)
+    else:
+        await page.set_viewport_size({"width": 900, "height": 1080})
+
+    # 增加 10s 停顿再开始录制
+    print(f"休眠{duration / 2}ms")
+    await page.wait_for_timeout(timeout=duration / 2)
+    # 多次滚动直到所有内容可见
+    max_attempts = 5
+    attempt = 0
+    while attempt < max_attempts:
+
+        # 尝试滚动更多
+        scrolled = await scroll_to_bottom(page, viewport_height=1920)
+
+        await page.wait_for_timeout(1000)
+
+        # 如果没有滚动或内容已完全显示则退出
+        if scrolled == 0:
+            break
+
+        attempt += 1
+        print(f"🔄 第 {attempt} 次滚动完成，继续检查是否有更多内容")
+    print(f"休眠{duration / 2}ms")
+    await page.wait_for_timeout(timeout=duration / 2)
+
+    await page.wait_for_timeout(3000)
+
+    # 新增：等待图片加载完成
+
+    # 截图
+    if image_path:
+        await page.screenshot(path=image_path, full_page=True)
+
+    # 如果指定了视频路径，则保存视频（注意顺序）
+    if video_path:
+        tmp_video_path = video_path.replace(".mp4", '') + "_" + str(duration/1000) + "s" + '_tmp.mp4'
+        await page.close()  # 🔥 先关闭页面
+        video = page.video
+        if video:
+            await video.save_as(tmp_video_path)
+            print(f"🎥 已生成{'移动端' if mobile else '桌面'}视频文件: {tmp_video_path}")
+            directory = os.path.dirname(tmp_video_path)
+            for f in os.listdir(directory):
+                if f.lower().endswith(".webm"):
+                    try:
+                        os.remove(os.path.join(directory, f))
+                        print(f"🗑️ 清理 .webm 文件: {f}")
+                    except Exception as e:
+                        print(f"❌ 清理失败: {f}, 错误: {e}")
+    # 关闭资源
+    route_filter.report("渲染")
+    await context.close()
+    return tmp_video_path
+
+
 async def html_to_image_with_playwright(html_path, image_path=None, video_path=None, mobile=False, duration=7000):
     """
     使用 Playwright 将 HTML 内容转为 PNG 图像并录制视频
@@ -558,93 +651,21 @@ async def html_to_image_with_playwright(html_path, image_path=None, video_path=N
     print(html_path, image_path, video_path, mobile, duration)
     abs_html_path = os.path.abspath(html_path)
 
-    async with async_playwright() as p:
-        # 启动浏览器（headless=True 用于无头模式）
-        browser = await p.chromium.launch(headless=True)
-
-        # 设置上下文（启用录屏）
-        context_args = {}
-        if video_path:
-            os.makedirs(os.path.dirname(video_path), exist_ok=True)
-            context_args.update(
-                record_video_dir=os.path.dirname(video_path),
-                record_video_size={"width": 1080, "height": 1920}
-            )
-
-        # 创建带录屏功能的上下文
-        context = await browser.new_context(**context_args)
-        page = await context.new_page()
-
-        # 加载 HTML 页面
-        await page.goto(f"file://{abs_html_path}")
-
-        if mobile:
-            # 设置为 iPhone 12 视口 + 移动端 UA
-            await page.set_viewport_size({"width": 1080, "height": 1920})
-            await page.add_init_script("""
-                Object.defineProperty(navigator, 'userAgent', {
-                    value: 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.4 (KHTML, like Gecko) Version/14.0 Mobile/15A5370a Safari/604.1',
-                    configurable: false,
-                    writable: false,
-                    enumerable: true
-                })
-            """)
-        else:
-            await page.set_viewport_size({"width": 900, "height": 1080})
-
-        # 增加 10s 停顿再开始录制
-        print(f"休眠{duration / 2}ms")
-        await page.wait_for_timeout(timeout=duration / 2)
-        # 多次滚动直到所有内容可见
-        max_attempts = 5
-        attempt = 0
-        while attempt < max_attempts:
-
-            # 尝试滚动更多
-            scrolled = await scroll_to_bottom(page, viewport_height=1920)
-
-            await page.wait_for_timeout(1000)
-
-            # 如果没有滚动或内容已完全显示则退出
-            if scrolled == 0:
-                break
-
-            attempt += 1
-            print(f"🔄 第 {attempt} 次滚动完成，继续检查是否有更多内容")
-        print(f"休眠{duration / 2}ms")
-        await page.wait_for_timeout(timeout=duration / 2)
-
-        await page.wait_for_timeout(3000)
-
-        # 新增：等待图片加载完成
-
-        # 截图
-        if image_path:
-            await page.screenshot(path=image_path, full_page=True)
-
-        # 如果指定了视频路径，则保存视频（注意顺序）
-        if video_path:
-            tmp_video_path = video_path.replace(".mp4", '') + "_" + str(duration/1000) + "s" + '_tmp.mp4'
-            await page.close()  # 🔥 先关闭页面
-            video = page.video
-            if video:
-                await video.save_as(tmp_video_path)
-                print(f"🎥 已生成{'移动端' if mobile else '桌面'}视频文件: {tmp_video_path}")
-                directory = os.path.dirname(tmp_video_path)
-                for f in os.listdir(directory):
-                    if f.lower().endswith(".webm"):
-                        try:
-                            os.remove(os.path.join(directory, f))
-                            print(f"🗑️ 清理 .webm 文件: {f}")
-                        except Exception as e:
-                            print(f"❌ 清理失败: {f}, 错误: {e}")
-        # 关闭资源
-        await context.close()
-        await browser.close()
-        # time.sleep(3)
+    if warm_browser_enabled():
+        # 复用常驻浏览器，只为本次渲染新建一个带录屏的上下文
+        tmp_video_path = await get_browser_manager().run_with_browser(
+            lambda browser: _render_html(browser, abs_html_path, image_path, video_path, mobile, duration))
+    else:
+        async with async_playwright() as p:
+            # 启动浏览器（headless=True 用于无头模式）
+            browser = await p.chromium.launch(headless=True)
+            tmp_video_path = await _render_html(browser, abs_html_path, image_path, video_path, mobile, duration)
+            await browser.close()
+            # time.sleep(3)
 
     # 👇 新增：裁剪最后 1 秒
-    process_video_with_first_frame(tmp_video_path, output_path=video_path)
+    if tmp_video_path:
+        process_video_with_first_frame(tmp_video_path, output_path=video_path)
     # 图片裁剪
     if image_path:
         crop_image_with_gray_area(image_path, image_path)
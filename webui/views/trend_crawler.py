@@ -2,7 +2,7 @@
 import gradio as gr
 
 from webui.utils.conf import load_regions_choices
-from webui.service.crawler import run_crawler
+from webui.service.crawler import run_crawler, run_multi_region_crawler
 from webui.utils.log import update_task_log_textbox
 
 
@@ -18,8 +18,23 @@ def build_tab():
             category = gr.Dropdown(label="分类", choices=list(choices_data['category_names'].keys()),
                                    value="所有分类")
             nums = gr.Slider(minimum=1, maximum=25, step=1, label="热词采集数量（最大25）", value=25)
+            use_rss = gr.Checkbox(label="快速采集（通过 RSS，不启动浏览器；不支持分类筛选，无搜索增长率）", value=False)
             button = gr.Button("开始采集")
-            button.click(fn=run_crawler, inputs=[to_download_image, origin, category, nums],
+            button.click(fn=run_crawler, inputs=[to_download_image, origin, category, nums, use_rss],
                          outputs=gr.Textbox(label="采集结果"))
         gr.Textbox(label="采集日志", value=update_task_log_textbox, lines=10, max_lines=15,
-                                      every=5)
\ No newline at end of file
+                                      every=5)
+
+    gr.Markdown("多地区并行采集：在同一个浏览器中并发采集所选地区与分类的全部组合，每个组合单独生成任务文件夹。")
+    with gr.Row():
+        with gr.Column():
+            multi_to_download_image = gr.Checkbox(label="下载Google Trends上的三张图片", value=False, )
+            origins = gr.Dropdown(label="地区（可多选）", choices=list(choices_data['regions'].keys()),
+                                  value=["美国"], multiselect=True)
+            categories = gr.Dropdown(label="分类（可多选）", choices=list(choices_data['category_names'].keys()),
+                                     value=["所有分类"], multiselect=True)
+            multi_nums = gr.Slider(minimum=1, maximum=25, step=1, label="热词采集数量（最大25）", value=25)
+            multi_button = gr.Button("开始并行采集")
+            multi_button.click(fn=run_multi_region_crawler,
+                               inputs=[multi_to_download_image, origins, categories, multi_nums],
+                               outputs=gr.Textbox(label="采集结果"))